@@ -1,18 +1,216 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from cachetools import TTLCache
+from sqlalchemy import event
 from sqlalchemy.orm import sessionmaker
 from telegram.ext import Updater
 from sqlalchemy.ext.declarative import declarative_base
 import os
 import logging
-import pymysql
+import threading
+from dbpool import create_database_engine
+
+try:
+    import pymysql  # only needed for MySQL
+except ImportError:
+    pymysql = None
 
 # SQLAlchemy
-engine = create_engine(os.environ["db_url"], echo=False)
-Session = sessionmaker(bind=engine, autoflush=False)
+engine = create_database_engine(os.environ["db_url"], os.environ)
+session_factory = sessionmaker(bind=engine, autoflush=False)
 Base = declarative_base()
 
+
+# Unit of work: while a session scope is open in a thread, every Session() in it
+# shares one session, which is committed once when the scope ends.
+# The bot opens a scope around every telegram update. see session_scope().
+_scopes = threading.local()
+
+
+class UnitOfWork:
+    def __init__(self):
+        self.session = session_factory(expire_on_commit=False)
+        self.statements = 0  # SQL statements sent to the database so far
+        self.writes = 0  # of which not SELECT
+
+
+class ScopedSession:
+    """What Session() returns inside a session scope. `with` doesn't close it, and
+    commit() only flushes, so that the scope can commit everything at once."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def commit(self):
+        self._session.flush()
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def Session(**kwargs):
+    """Returns the current session scope's session, or a new session if there is
+    no scope open. Use as `with Session() as s:`."""
+    scope = current_scope()
+    if scope:
+        return ScopedSession(scope.session)
+    return session_factory(**kwargs)
+
+
+def current_scope():
+    return getattr(_scopes, "current", None)
+
+
+def begin_scope():
+    """Opens a session scope in this thread, unless one is open already."""
+    if not current_scope():
+        _scopes.current = UnitOfWork()
+    return current_scope()
+
+
+def end_scope(commit=True):
+    """Commits (or rolls back) and closes the session scope of this thread.
+    Returns the closed scope, or None if there wasn't one."""
+    scope = current_scope()
+    if not scope:
+        return None
+    _scopes.current = None
+    try:
+        if commit:
+            scope.session.commit()
+        else:
+            scope.session.rollback()
+    except Exception:
+        scope.session.rollback()
+        raise
+    finally:
+        scope.session.close()
+    return scope
+
+
+@contextmanager
+def session_scope():
+    """Shares one session between everything done inside the with block, and
+    commits it at the end, or rolls it back if an exception is raised.
+    A scope that is already open is reused, and left for its opener to end."""
+    if current_scope():
+        yield current_scope()
+        return
+    scope = begin_scope()
+    try:
+        yield scope
+    except Exception:
+        end_scope(commit=False)
+        raise
+    end_scope()
+
+
+def after_commit(callback, session=None):
+    """Calls callback once the session scope of this thread has committed what it
+    wrote, or now if there is no scope or it hasn't written anything. callback is
+    dropped if the scope rolls back. With a session, waits for its commit instead
+    when there is no scope."""
+    scope = current_scope()
+    if scope and scope.writes:
+        session = scope.session
+    if session is None:
+        callback()
+    else:
+        session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(session_factory, "after_commit")
+def run_after_commit(session):
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(session_factory, "after_rollback")
+def drop_after_commit(session):
+    session.info.pop("after_commit", None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    scope = current_scope()
+    if scope:
+        scope.statements += 1
+        if not statement.lstrip()[:6].upper() == "SELECT":
+            scope.writes += 1
+
+
+# Read replica: with db_replica_url set, stats and streaks read records from a
+# replica of the database (see ReadSession). After a user writes, their reads go
+# to the primary database for db_replica_lag seconds, so that they see their own
+# writes even if the replica lags behind.
+replica_engine = None
+replica_session_factory = None
+recent_writers = TTLCache(
+    maxsize=100000, ttl=float(os.environ.get("db_replica_lag", 10))
+)
+recent_writers_lock = threading.Lock()
+
+
+def configure_replica(db_url):
+    """Reads from the database at db_url as the replica, or stops using a replica
+    if db_url is None. Returns the replica's engine."""
+    global replica_engine, replica_session_factory
+    if replica_engine:
+        replica_engine.dispose()
+    replica_engine, replica_session_factory = None, None
+    if db_url:
+        replica_engine = create_database_engine(db_url, os.environ)
+        replica_session_factory = sessionmaker(bind=replica_engine, autoflush=False)
+    return replica_engine
+
+
+def wrote(user_id):
+    """Sends the reads of user_id to the primary database for a while."""
+    with recent_writers_lock:
+        recent_writers[user_id] = True
+
+
+def ReadSession(user_id, **kwargs):
+    """Returns a session of the replica for reads of user_id's data that don't
+    have to be in the current session scope. Returns Session() instead if there
+    is no replica, if the scope has written anything, or if the user wrote
+    recently."""
+    scope = current_scope()
+    if replica_session_factory is None or (scope and scope.writes):
+        return Session(**kwargs)
+    with recent_writers_lock:
+        if user_id in recent_writers:
+            return Session(**kwargs)
+    return replica_session_factory(**kwargs)
+
+
+configure_replica(os.environ.get("db_replica_url"))
+
+
+# Streak calculators. see calculator_backends in models.models for the options.
+calculator_backend = os.environ.get("calculator_backend", "memory")
+
 # Telegram
-updater = Updater(token=os.environ["token"])
+# persistence_url: database to keep conversations in, so that they survive
+# restarts. Conversations are not kept if it is not set.
+persistence = None
+if os.environ.get("persistence_url"):
+    from persistence import SQLPersistence
+
+    if os.environ["persistence_url"] == os.environ["db_url"]:
+        # written after the update's scope commits. see SQLPersistence.
+        persistence = SQLPersistence(engine=engine, defer=after_commit)
+    else:
+        persistence = SQLPersistence(url=os.environ["persistence_url"])
+updater = Updater(token=os.environ["token"], persistence=persistence)
 dispatcher = updater.dispatcher
 
 
@@ -0,0 +1,136 @@
+"""Benchmarks the hot crud lookups: ORM queries against crud's lambda statements.
+
+get_user, get_habit, get_method and get_record run on almost every update. This
+times one call of each, past the read-through caches, in a local SQLite file:
+"query" builds and compiles an ORM query on every call, as crud did before, and
+"lambda" runs crud's lambda statement, which is compiled once. Run from the
+project directory:
+
+    python benchmarks/bench_lookups.py
+    python benchmarks/bench_lookups.py --min-time 2
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+DEFAULT_DB = "benchmark.db"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite file to use.")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.5,
+        help="Seconds to repeat each lookup for.",
+    )
+    parser.add_argument("--keep", action="store_true", help="Keep the SQLite file.")
+    return parser.parse_args()
+
+
+args = parse_args()
+# base reads these on import. The benchmark never touches a real database or bot.
+os.environ["db_url"] = f"sqlite:///{args.db}"
+os.environ.setdefault("token", "123456:benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+import base
+from controllers import crud
+from models.models import Habit, Method, Record, User
+
+logging.disable(logging.CRITICAL)
+
+USER_ID = 1
+TODAY = datetime.date(2022, 6, 15)
+
+
+def create_habit():
+    base.Base.metadata.drop_all(base.engine)
+    base.Base.metadata.create_all(base.engine)
+    with base.Session(expire_on_commit=False) as s:
+        s.add(User(USER_ID, 0))
+        method = Method(type="interval", duration="day", interval=1)
+        s.add(method)
+        s.commit()
+        habit = Habit("benchmark", USER_ID, method.id)
+        s.add(habit)
+        s.commit()
+        s.add_all(
+            Record(USER_ID, habit.id, TODAY - datetime.timedelta(days=i))
+            for i in range(365)
+        )
+        s.commit()
+    return habit
+
+
+def lookups(habit):
+    """(name, query lookup, lambda lookup) of every hot lookup, each a function
+    of an open session."""
+    return [
+        (
+            "get_user",
+            lambda s: s.query(User).filter_by(id=USER_ID).one_or_none(),
+            lambda s: s.execute(crud.user_by_id(USER_ID)).scalar_one_or_none(),
+        ),
+        (
+            "get_habit",
+            lambda s: s.query(Habit).filter_by(id=habit.id).one_or_none(),
+            lambda s: s.execute(crud.habit_by_id(habit.id)).scalar_one_or_none(),
+        ),
+        (
+            "get_method",
+            lambda s: s.query(Method).filter_by(id=habit.method).one_or_none(),
+            lambda s: s.execute(crud.method_by_id(habit.method)).scalar_one_or_none(),
+        ),
+        (
+            "get_record",
+            lambda s: s.query(Record)
+            .filter_by(user=USER_ID, habit=habit.id, date=TODAY)
+            .one_or_none(),
+            lambda s: s.execute(
+                crud.record_on_date(USER_ID, habit.id, TODAY)
+            ).scalar_one_or_none(),
+        ),
+    ]
+
+
+def measure(lookup, min_time):
+    """Returns microseconds per call of lookup, in one session that is cleared
+    after every call, so that every call runs its query."""
+    with base.session_factory() as s:
+        lookup(s)
+        runs = 0
+        start = time.perf_counter()
+        while True:
+            lookup(s)
+            s.expunge_all()
+            runs += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                return elapsed / runs * 1e6
+
+
+def main():
+    habit = create_habit()
+
+    header = f"{'lookup':<14}{'query µs':>10}{'lambda µs':>11}{'saved':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, query, statement in lookups(habit):
+        before = measure(query, args.min_time)
+        after = measure(statement, args.min_time)
+        print(f"{name:<14}{before:>10.1f}{after:>11.1f}{1 - after / before:>8.0%}")
+
+    base.engine.dispose()
+    if not args.keep:
+        os.remove(args.db)
+
+
+if __name__ == "__main__":
+    main()
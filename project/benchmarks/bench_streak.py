@@ -0,0 +1,192 @@
+"""Benchmarks streak() and total_loggable_days() of every calculator backend.
+
+Generates synthetic habits for every kind of method, with 30 days to 10 years of
+records, in a local SQLite file, and reports operations per second and peak
+memory of each calculator. Every operation creates its calculator first.
+
+Calculators read their records from one of two sources: "db" queries the SQLite
+file, "dates" hands them the already loaded dates (only backends that work in
+memory support it). Run from the project directory:
+
+    python benchmarks/bench_streak.py
+    python benchmarks/bench_streak.py --days 365 3650 --backends memory bitmap
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+DEFAULT_DB = "benchmark.db"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite file to use.")
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365, 1825, 3650])
+    parser.add_argument("--backends", nargs="+", default=None)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="Seconds to repeat each operation for.",
+    )
+    parser.add_argument("--keep", action="store_true", help="Keep the SQLite file.")
+    return parser.parse_args()
+
+
+args = parse_args()
+# base reads these on import. The benchmark never touches a real database or bot.
+os.environ["db_url"] = f"sqlite:///{args.db}"
+os.environ.setdefault("token", "123456:benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+import base
+from models.models import Habit, Method, Record, User, get_calculator_backends
+
+logging.disable(logging.CRITICAL)
+
+USER_ID = 1
+TODAY = datetime.date(2022, 6, 15)
+METHODS = {
+    "daily": {"type": "interval", "duration": "day", "interval": 1},
+    "interval 3": {"type": "interval", "duration": "day", "interval": 3},
+    "count 4/week": {"type": "count", "duration": "week", "count": 4},
+    "count 12/month": {"type": "count", "duration": "month", "count": 12},
+    "weekdays 1,3,5": {"type": "specified", "duration": "week", "specified": [1, 3, 5]},
+    "month days 1,15,28": {
+        "type": "specified",
+        "duration": "month",
+        "specified": [1, 15, 28],
+    },
+}
+
+
+def synthetic_dates(method, days, rng):
+    """Done dates of a habit that mostly keeps up with its method over days,
+    with a few missed days."""
+    dates = []
+    for i in range(days):
+        date = TODAY - datetime.timedelta(days=i)
+        if method["type"] == "interval":
+            goal = i % method["interval"] == 0
+        elif method["type"] == "count":
+            goal = rng.random() < 0.7
+        elif method["duration"] == "week":
+            goal = date.isoweekday() in method["specified"]
+        else:
+            goal = date.day in method["specified"]
+        if goal and rng.random() > 0.002:
+            dates.append(date)
+    return dates
+
+
+def create_habits(days_list):
+    """Creates a habit for every method and history length. Returns
+    (method name, days, habit) tuples."""
+    base.Base.metadata.drop_all(base.engine)
+    base.Base.metadata.create_all(base.engine)
+    rng = random.Random(0)
+    habits = []
+    with base.Session(expire_on_commit=False) as s:
+        s.add(User(USER_ID, 0))
+        s.commit()
+        for name, kwargs in METHODS.items():
+            # methods are unique by definition, so habits of one share it.
+            method = Method(**kwargs)
+            s.add(method)
+            s.commit()
+            for days in days_list:
+                habit = Habit(f"{name} {days}", USER_ID, method.id)
+                s.add(habit)
+                s.commit()
+                s.bulk_insert_mappings(
+                    Record,
+                    [
+                        {"user": USER_ID, "habit": habit.id, "date": date}
+                        for date in synthetic_dates(kwargs, days, rng)
+                    ],
+                )
+                s.commit()
+                habits.append((name, days, habit, method))
+    return habits
+
+
+def run_once(calculator_class, method, operation, records, dates):
+    calculator = calculator_class(
+        records=records,
+        today_date=TODAY,
+        interval=method.interval,
+        duration=method.duration,
+        count=method.count,
+        specified_mask=method.specified_mask,
+        **({"dates": dates} if dates is not None else {}),
+    )
+    return getattr(calculator, operation)()
+
+
+def measure(calculator_class, habit, method, operation, source, min_time):
+    """Returns (operations per second, peak memory in KiB) of an operation."""
+    with base.Session() as s:
+        records = s.query(Record).filter_by(habit=habit.id).order_by(Record.date.desc())
+        dates = None
+        if source == "dates":
+            dates = [record.date for record in records]
+        run = lambda: run_once(calculator_class, method, operation, records, dates)
+
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        runs = 0
+        start = time.perf_counter()
+        while True:
+            run()
+            runs += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                return runs / elapsed, peak / 1024
+
+
+def main():
+    backends = args.backends or list(get_calculator_backends())
+    habits = create_habits(args.days)
+
+    header = f"{'method':<20}{'days':>6}  {'backend':<9}{'source':<7}{'operation':<21}"
+    print(header + f"{'ops/sec':>11}{'peak KiB':>11}")
+    print("-" * (len(header) + 22))
+    for name, days, habit, method in habits:
+        for backend in backends:
+            calculator_class = method.get_calculator(backend)
+            # the database backend can only read records through a query.
+            sources = ["db"] if backend == "database" else ["db", "dates"]
+            for source in sources:
+                for operation in ["streak", "total_loggable_days"]:
+                    row = f"{name:<20}{days:>6}  {backend:<9}{source:<7}{operation:<21}"
+                    try:
+                        ops, peak = measure(
+                            calculator_class,
+                            habit,
+                            method,
+                            operation,
+                            source,
+                            args.min_time,
+                        )
+                    except RecursionError:
+                        print(row + f"{'RecursionError':>22}")
+                        continue
+                    print(row + f"{ops:>11.1f}{peak:>11.1f}")
+
+    base.engine.dispose()
+    if not args.keep:
+        os.remove(args.db)
+
+
+if __name__ == "__main__":
+    main()
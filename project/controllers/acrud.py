@@ -0,0 +1,144 @@
+"""Async versions of the lookups in crud, so that a handler can run independent
+queries at the same time instead of one after another:
+
+    user, habits = acrud.run(
+        acrud.gather(acrud.get_user(user_id), acrud.get_user_habits(user_id))
+    )
+
+Queries run on an asyncio engine of the database (see
+dbpool.create_async_database_engine) when its async driver is installed. Without
+one, each query runs with a sync session in a thread of its own.
+
+Handlers run in the dispatcher's threads, not in an event loop. run() is the sync
+shim between them: it runs a coroutine on acrud's event loop and waits for it.
+
+acrud doesn't use the session scope of the update (see base.session_scope), so it
+only sees committed data. Once the update has written anything, run() runs the
+queries one after another with the scope's session instead, like crud does.
+"""
+
+import asyncio
+import os
+import threading
+
+import sqlalchemy as sqa
+from sqlalchemy.orm import Session as SyncSession
+
+import base
+from controllers import cache, crud
+from dbpool import create_async_database_engine
+from models.models import Habit
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession
+except ImportError:  # needs greenlet
+    AsyncSession = None
+
+NOT_CREATED = object()
+
+_engine = NOT_CREATED
+_loop = None
+_lock = threading.Lock()
+
+
+def get_engine():
+    """The asyncio engine, or None if the database has no async driver installed."""
+    global _engine
+    with _lock:
+        if _engine is NOT_CREATED:
+            _engine = create_async_database_engine(os.environ["db_url"], os.environ)
+        return _engine
+
+
+def get_loop():
+    """The event loop of acrud, running in a thread of its own."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="acrud")
+            thread.daemon = True
+            thread.start()
+        return _loop
+
+
+def run(coroutine, timeout=None):
+    """Runs coroutine on acrud's event loop and returns its result, for sync code
+    like handlers. If this thread's session scope has written anything, which
+    acrud's loop wouldn't see, runs it in this thread with the scope's session."""
+    scope = base.current_scope()
+    if scope and scope.writes:
+        return asyncio.run(coroutine)
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result(timeout)
+
+
+async def gather(*coroutines):
+    """Runs the coroutines at the same time. Returns a list of their results."""
+    return list(await asyncio.gather(*coroutines))
+
+
+async def execute(statement):
+    """Runs a select statement and returns its rows. ORM objects in them are
+    detached, with their columns loaded."""
+    if base.current_scope():  # see run()
+        return execute_in_scope(statement)
+    engine = get_engine()
+    if engine is None:
+        return await asyncio.to_thread(execute_sync, statement)
+    async with AsyncSession(engine, expire_on_commit=False) as s:
+        return (await s.execute(statement)).all()
+
+
+def execute_sync(statement):
+    with SyncSession(base.engine, expire_on_commit=False) as s:
+        return s.execute(statement).all()
+
+
+def execute_in_scope(statement):
+    with base.Session() as s:
+        rows = s.execute(statement).all()
+        for row in rows:
+            for value in row:
+                if isinstance(value, base.Base) and sqa.inspect(value).persistent:
+                    s.expunge(value)
+        return rows
+
+
+async def first(statement):
+    rows = await execute(statement)
+    return rows[0][0] if rows else None
+
+
+##### Get #####
+
+
+async def get_user(id):
+    """Cached, shared with crud.get_user."""
+    return await cache.users.get_async(id, lambda: first(crud.user_by_id(id)))
+
+
+async def get_habit(id, user_id):
+    """Cached, shared with crud.get_habit."""
+    habit = await cache.habits.get_async(id, lambda: first(crud.habit_by_id(id)))
+    if habit and habit.user == user_id:
+        return habit
+    return None
+
+
+async def get_method(id):
+    """Cached, shared with crud.get_method."""
+    return await cache.methods.get_async(id, lambda: first(crud.method_by_id(id)))
+
+
+async def get_record(user_id, habit_id, date):
+    return await first(crud.record_on_date(user_id, habit_id, date))
+
+
+async def get_user_habits(user_id):
+    """Like User.get_habits(): name, id, user and method of the user's habits,
+    newest first."""
+    return await execute(
+        sqa.select(Habit.name, Habit.id, Habit.user, Habit.method)
+        .filter_by(user=user_id)
+        .order_by(Habit.id.desc())
+    )
@@ -0,0 +1,33 @@
+"""Commands for the bot's admins, whose telegram ids are in the admin_ids env
+variable, separated by commas. Other users get no answer."""
+
+import os
+
+from base import engine, logger
+from controllers import crud
+from dbpool import format_pool_status, pool_status
+from controllers.ptbshortcuts import get_from_user
+
+
+def admin_ids():
+    ids = os.environ.get("admin_ids", "").split(",")
+    return {int(id) for id in ids if id.strip()}
+
+
+def pool_stats(update, context):
+    """/poolstats: shows the database connection pool's statistics."""
+    if get_from_user(update).id not in admin_ids():
+        return
+    update.message.reply_text(format_pool_status(pool_status(engine)))
+
+
+def log_pool_stats(context):
+    """A job that logs the pool's statistics. see db_pool_log_interval in run.py."""
+    logger.info(f"Database pool: {format_pool_status(pool_status(engine))}")
+
+
+def collect_unused_methods(context):
+    """A job that deletes methods no habit uses. see method_gc_interval in run.py."""
+    deleted = crud.collect_unused_methods()
+    if deleted:
+        logger.info(f"Deleted {deleted} unused methods.")
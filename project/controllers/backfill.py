@@ -0,0 +1,134 @@
+import re
+from datetime import datetime, timedelta
+
+from telegram.ext.callbackqueryhandler import CallbackQueryHandler
+from telegram.ext.commandhandler import CommandHandler
+from telegram.ext.filters import Filters
+from telegram.ext.messagehandler import MessageHandler
+from telegram.inline.inlinekeyboardbutton import InlineKeyboardButton
+from telegram.inline.inlinekeyboardmarkup import InlineKeyboardMarkup
+from controllers import crud
+from controllers.base import Conversation
+from controllers.mixins import ChooseHabitMixin
+from controllers.mainkeys import backfill
+from models.models import date_in_timezone
+
+# the longest range that can be logged at once.
+MAX_DAYS = 3660
+
+DATE = r"\d{4}-\d{1,2}-\d{1,2}"
+RANGE_PATTERN = re.compile(rf"^({DATE})(?:\s*(?:\.\.|to|-)\s*({DATE}))?$")
+
+
+def parse_dates(text, today):
+    """Returns the set of dates in text: dates (YYYY-MM-DD) and ranges of dates
+    (YYYY-MM-DD to YYYY-MM-DD), separated by commas or new lines.
+    Raises ValueError with a message for the user if text is not valid."""
+    dates = set()
+    for part in re.split(r"[,\n]", text):
+        part = part.strip().lower()
+        if not part:
+            continue
+        match = RANGE_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"I couldn't read {part}.")
+        start = read_date(match.group(1))
+        end = read_date(match.group(2)) if match.group(2) else start
+        if end < start:
+            start, end = end, start
+        if end > today:
+            raise ValueError(f"{end} hasn't come yet!")
+        if (end - start).days + 1 + len(dates) > MAX_DAYS:
+            raise ValueError(f"You can log at most {MAX_DAYS} days at once.")
+        dates.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+    if not dates:
+        raise ValueError("I couldn't find any dates.")
+    return dates
+
+
+def read_date(text):
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"{text} is not a date.")
+
+
+class Backfill(ChooseHabitMixin, Conversation):
+    """Logs many past days of a habit at once, for users who tracked it elsewhere."""
+
+    def __init__(self):
+        super().__init__()
+        self.name = "Backfill"
+        self.entry_points = [
+            CommandHandler(backfill, self.ask_habit),
+            CallbackQueryHandler(self.ask_habit, pattern=f"^{self.keys.id}$"),
+        ]
+        self.states = self.choose_habit_states | {
+            self.keys.answer1: [
+                MessageHandler(Filters.text & ~Filters.command, self.get_dates),
+                self.main_menu_callback_state,
+            ],
+            self.keys.answer2: [
+                CallbackQueryHandler(self.ask_habit, pattern=f"^{self.keys.id}$"),
+                self.main_menu_callback_state,
+            ],
+        }
+        self.create_handler()
+
+        self.user = None
+        self.habit = None
+
+    def add_keys(self):
+        super().add_keys()
+        self.keys.id = backfill
+        self.keys.answer1 = self.keys.id + "1"
+        self.keys.answer2 = self.keys.id + "2"
+
+    def ask_habit(self, update, context):
+        if self.user_doesnt_exist(update):
+            return self.redirect_to_timezone(update, context)
+        self.choose_habit_text = "Which habit do you want to log past days for?"
+        return super().ask_habit(update, context)
+
+    def get_habit(self, update, context):
+        update_, context_ = super().get_habit(update, context)
+        return self.ask_dates(update_, context_)
+
+    def ask_dates(self, update, context):
+        text = (
+            f"Logging past days for {self.habit.name}\n"
+            "\n"
+            "Send me the days you did it, as dates or ranges of dates, "
+            "separated by commas or new lines. For example:\n"
+            "<code>2022-01-01 to 2022-03-31, 2022-04-02</code>\n"
+            "\n"
+            "💡 Days that you've already logged will stay as they are."
+        )
+        keyboard = InlineKeyboardMarkup([self.main_menu_button])
+        update.callback_query.edit_message_text(
+            text, reply_markup=keyboard, parse_mode="HTML"
+        )
+        return self.keys.answer1
+
+    def get_dates(self, update, context):
+        today = date_in_timezone(self.user.timezone)
+        try:
+            dates = parse_dates(update.message.text, today)
+        except ValueError as error:
+            update.message.reply_text(f"{error} Please try again.")
+            return self.keys.answer1
+
+        logged = crud.create_records(self.user.id, self.habit.id, dates)
+        text = f"✅ Logged {len(logged)} days for {self.habit.name}."
+        if len(logged) < len(dates):
+            text += f"\n{len(dates) - len(logged)} of them were already logged."
+        buttons = [
+            [
+                InlineKeyboardButton(
+                    "🗓 Backfill another habit", callback_data=self.keys.id
+                )
+            ],
+            self.main_menu_button,
+        ]
+        update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(buttons))
+        return self.keys.answer2
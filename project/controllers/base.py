@@ -3,6 +3,7 @@ from telegram.ext.callbackqueryhandler import CallbackQueryHandler
 from telegram.ext.commandhandler import CommandHandler
 from telegram.inline.inlinekeyboardbutton import InlineKeyboardButton
 from telegram.inline.inlinekeyboardmarkup import InlineKeyboardMarkup
+from base import persistence
 from controllers import mainkeys
 from controllers.crud import get_user
 from controllers.ptbshortcuts import get_from_user, send_message
@@ -78,6 +79,7 @@ class Conversation:
         self.keys.edit_timezone = mainkeys.edit_timezone
         self.keys.deletemydata = mainkeys.deletemydata
         self.keys.feedback = mainkeys.feedback
+        self.keys.backfill = mainkeys.backfill
 
     def create_handler(self):
         """Function to create a conversation handler that includes the basic attributes
@@ -99,6 +101,7 @@ class Conversation:
             fallbacks=fallbacks,
             map_to_parent=map_to_parent,
             name=name,
+            persistent=persistence is not None,
         )
 
     def main_menu(self, update, context):
@@ -132,9 +135,12 @@ class Conversation:
                 ),
             ],
             [
+                InlineKeyboardButton(
+                    "Backfill Past Days", callback_data=self.keys.backfill
+                ),
                 InlineKeyboardButton(
                     "Send Your Feedback", callback_data=self.keys.feedback
-                )
+                ),
             ],
         ]
         keyboard = InlineKeyboardMarkup(buttons)
@@ -0,0 +1,115 @@
+"""Read-through caches of users, habits and methods, in front of the crud lookups.
+
+Cached objects are detached from their session, and shared between handlers, so
+they must not be changed: crud changes the database with queries, and clears
+the cached objects it changes.
+
+Inside a session scope that has written, nothing is cached or cleared for good
+until the scope commits (see base.after_commit): other threads must not cache
+rows that may still be rolled back, or the rows as they were before the commit.
+"""
+
+import os
+import threading
+
+from cachetools import TTLCache
+
+from base import after_commit
+
+# a lookup that found nothing is cached too, as this.
+MISSING = object()
+
+
+class ReadThroughCache:
+    """A bounded cache of database lookups, whose entries expire after ttl seconds."""
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # changes on every invalidation, so that a value loaded before it isn't
+        # cached after it.
+        self.generation = 0
+
+    def get(self, key, load):
+        """Returns the cached value of key, or calls load() and caches what it
+        returns, once the session scope commits if load() wrote anything."""
+        value, generation = self.lookup(key)
+        if value is not MISSING:
+            return value
+        value = load()
+        after_commit(lambda: self.store(key, value, generation))
+        return value
+
+    async def get_async(self, key, load):
+        """Like get(), for a load() that returns an awaitable."""
+        value, generation = self.lookup(key)
+        if value is not MISSING:
+            return value
+        value = await load()
+        after_commit(lambda: self.store(key, value, generation))
+        return value
+
+    def lookup(self, key):
+        """Returns the cached value of key, or MISSING, and the generation."""
+        with self.lock:
+            value = self.cache.get(key, MISSING)
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value, self.generation
+
+    def store(self, key, value, generation):
+        """Caches value, unless the cache was invalidated since it was loaded."""
+        with self.lock:
+            if generation == self.generation:
+                self.cache[key] = value
+
+    def invalidate(self, key):
+        """Forgets key now, and again when the session scope commits."""
+        self.forget(key)
+        after_commit(lambda: self.forget(key))
+
+    def forget(self, key):
+        with self.lock:
+            self.generation += 1
+            self.cache.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.cache.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+
+maxsize = int(os.environ.get("cache_size", 10000))
+ttl = int(os.environ.get("cache_ttl", 600))
+
+users = ReadThroughCache("users", maxsize, ttl)
+habits = ReadThroughCache("habits", maxsize, ttl)
+methods = ReadThroughCache("methods", maxsize, ttl)
+# ids of methods by their definition. see crud.create_method
+method_ids = ReadThroughCache("method_ids", maxsize, ttl)
+
+
+def detached(s, instance):
+    """Detaches a loaded object from session s, so that it can be cached."""
+    if instance is not None:
+        s.expunge(instance)
+    return instance
+
+
+def stats():
+    """Hits, misses and size of every cache."""
+    return {cache.name: cache.stats() for cache in [users, habits, methods, method_ids]}
+
+
+def clear():
+    for cache in [users, habits, methods, method_ids]:
+        cache.clear()
@@ -1,5 +1,14 @@
-from base import Session
-from models.models import User, Habit, Record, Method
+from itertools import groupby
+import sqlalchemy as sqa
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import make_transient_to_detached
+from base import Session, ReadSession, after_commit, calculator_backend, wrote
+from base import session_factory
+from models.models import User, Habit, Record, Method, StreakState
+from models.models import date_in_timezone, first_day_of_duration
+from models.models import normalize_name
+from models import timeline
+from controllers import cache
 
 
 ##### Create #####
@@ -8,18 +17,24 @@ from models.models import User, Habit, Record, Method
 def create_habit(name, user, method):
     with Session(expire_on_commit=False) as s:
         if type(method) == Method:
-            s.merge(method)
-            method = method.id
+            method = insert_method(s, method)
         if type(user) == User:
             s.merge(user)
             user = user.id
 
-        habit = s.query(Habit).filter_by(name=name, user=user).one_or_none()
+        habit = (
+            s.query(Habit.id)
+            .filter_by(normalized_name=normalize_name(name), user=user)
+            .first()
+        )
         if habit:
             return None
         habit = Habit(name=name, user=user, method=method)
         s.add(habit)
         s.commit()
+        # a lookup of a deleted habit may have cached its id as missing.
+        cache.habits.invalidate(habit.id)
+        wrote(user)
         return habit
 
 
@@ -30,82 +45,281 @@ def create_user(id, timezone):
             user = User(id=id, timezone=timezone)
             s.add(user)
             s.commit()
+            cache.users.invalidate(id)
 
         return user
 
 
 def create_record(user_id, habit_id, date):
-    with Session(expire_on_commit=False) as s:
-        record = (
-            s.query(Record)
-            .filter_by(user=user_id, habit=habit_id, date=date)
-            .one_or_none()
+    """Logs a habit as done on date. Returns the new record, or None if the date
+    was already logged. A single insert that skips existing dates, so logging the
+    same date twice at the same time can't create a duplicate."""
+    with Session() as s:
+        result = s.execute(
+            insert_ignore(s, Record).values(user=user_id, habit=habit_id, date=date)
         )
-        if record:
+        if not inserted_dates(s, habit_id, [date], result.rowcount):
             return None
-        record = Record(user=user_id, habit=habit_id, date=date)
-        s.add(record)
+        update_streak_state(s, habit_id, date, added=True)
+        s.commit()
+    wrote(user_id)
+    forget_timeline(habit_id)
+    record = Record(user=user_id, habit=habit_id, date=date)
+    record.id = result.inserted_primary_key[0]
+    make_transient_to_detached(record)
+    return record
+
+
+# rows of one insert, small enough for the parameter limits of every database.
+RECORDS_PER_INSERT = 300
+
+
+def create_records(user_id, habit_id, dates):
+    """Logs a habit as done on many dates at once, skipping dates that are already
+    logged. Inserts all new records with multi-row inserts.
+    Returns the dates that were logged, sorted."""
+    dates = set(dates)
+    if not dates:
+        return []
+    with Session() as s:
+        existing = (
+            s.query(Record.date)
+            .filter(
+                Record.habit == habit_id,
+                Record.date >= min(dates),
+                Record.date <= max(dates),
+            )
+            .all()
+        )
+        new_dates = sorted(dates - {date for (date,) in existing})
+        logged = []
+        for i in range(0, len(new_dates), RECORDS_PER_INSERT):
+            batch = new_dates[i : i + RECORDS_PER_INSERT]
+            rows = [
+                {"user": user_id, "habit": habit_id, "date": date} for date in batch
+            ]
+            insert = insert_ignore(s, Record).values(rows)
+            if s.get_bind().dialect.full_returning:
+                logged += s.execute(insert.returning(Record.date)).scalars()
+            else:
+                rowcount = s.execute(insert).rowcount
+                logged += inserted_dates(s, habit_id, batch, rowcount)
+        logged.sort()
+        if logged:
+            s.query(StreakState).filter_by(habit=habit_id).update({"stale": True})
         s.commit()
-        return record
+    if logged:
+        wrote(user_id)
+        forget_timeline(habit_id)
+    return logged
+
+
+def insert_ignore(s, model):
+    """Returns an insert into model's table that skips the rows that would break
+    a unique key: ON CONFLICT DO NOTHING, or ON DUPLICATE KEY UPDATE id = id on
+    MySQL, as its INSERT IGNORE would also skip rows with other errors."""
+    dialect = s.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == "mysql":
+        return mysql.insert(model).on_duplicate_key_update(id=model.id)
+    return sqlite.insert(model).on_conflict_do_nothing()
+
+
+def inserted_dates(s, habit_id, dates, rowcount):
+    """Returns which of dates an insert_ignore of the habit's records inserted,
+    from its rowcount.
+
+    If it skipped rows, another transaction logged those dates since they were
+    checked, and has committed them: a conflicting insert waits for that. The
+    records this session inserted aren't committed yet, so a session of its own
+    tells them apart. MySQL counts skipped rows too, so it always checks."""
+    if s.get_bind().dialect.name != "mysql":
+        if rowcount == len(dates):
+            return dates
+        if rowcount == 0:
+            return []
+    with session_factory() as other:
+        committed = {
+            date
+            for (date,) in other.query(Record.date).filter(
+                Record.habit == habit_id, Record.date.in_(dates)
+            )
+        }
+    return [date for date in dates if date not in committed]
 
 
 def create_method(*args, **kwargs):
     """required kwargs: type, duration
-    optional kwargs: specified, interval, count
-    you should have exactly one of the optional kwargs."""
+    optional kwargs: specified (or specified_mask), interval, count
+    you should have exactly one of the optional kwargs.
+
+    Identical methods are shared by their habits: returns the method with the same
+    definition if there is one, and only creates it otherwise. Ids of methods are
+    cached by definition."""
 
     type_ = kwargs.pop("type")
     duration = kwargs.pop("duration")
     if not (type_ and duration):
         return None
+    method = Method(type_, duration, **kwargs)
 
-    with Session(expire_on_commit=False) as s:
-        method = Method(type_, duration, **kwargs)
-        s.add(method)
-        s.commit()
-        return method
+    def load():
+        with Session() as s:
+            id = insert_method(s, method)
+            s.commit()
+            return id
+
+    return get_method(cache.method_ids.get(method.definition, load))
+
+
+def insert_method(s, method):
+    """Returns the id of the method with method's definition, in session s, and
+    inserts it first if there is none: method may be one that create_method
+    returned, and was collected since (see collect_unused_methods)."""
+    values = {
+        column.key: getattr(method, column.key)
+        for column in Method.__table__.columns
+        if column.key != "id"
+    }
+    inserted = s.execute(insert_ignore(s, Method).values(values)).rowcount
+    id = s.execute(
+        sqa.select(Method.id).where(Method.definition == method.definition)
+    ).scalar_one()
+    if inserted:
+        # a lookup of a deleted method may have cached the id as missing.
+        after_commit(lambda: cache.methods.invalidate(id), s)
+    return id
 
 
 ##### Get #####
 
 
 def get_user(id):
-    """gets user from db by their telegram id."""
-    with Session() as s:
-        user = s.query(User).filter_by(id=id).one_or_none()
-        return user
+    """gets user from db by their telegram id. Cached, see controllers.cache."""
+
+    def load():
+        with Session() as s:
+            return cache.detached(s, s.execute(user_by_id(id)).scalar_one_or_none())
+
+    return cache.users.get(id, load)
 
 
 def get_habit(id, user_id):
-    """gets habit from db by users id and habit id"""
-    with Session() as s:
-        habit = s.query(Habit).filter_by(id=id, user=user_id).one_or_none()
+    """gets habit from db by users id and habit id. Cached, see controllers.cache."""
+
+    def load():
+        with Session() as s:
+            return cache.detached(s, s.execute(habit_by_id(id)).scalar_one_or_none())
+
+    habit = cache.habits.get(id, load)
+    if habit and habit.user == user_id:
         return habit
+    return None
 
 
 def get_habit_by_name(habit_name, user_id):
-    """Gets habit from db by user id and habit name.
+    """Gets habit from db by user id and habit name, ignoring case.
     Returns none if user has no habit in that name.
     """
     with Session() as s:
-        habit = s.query(Habit).filter_by(name=habit_name, user=user_id).one_or_none()
+        habit = (
+            s.query(Habit)
+            .filter_by(normalized_name=normalize_name(habit_name), user=user_id)
+            .first()
+        )
         return habit
 
 
 def get_method(id):
-    with Session() as s:
-        method = s.query(Method).filter_by(id=id).one_or_none()
-        return method
+    """Cached, see controllers.cache."""
+
+    def load():
+        with Session() as s:
+            return cache.detached(s, s.execute(method_by_id(id)).scalar_one_or_none())
+
+    return cache.methods.get(id, load)
 
 
 def get_record(user_id, habit_id, date):
     with Session() as s:
-        record = (
-            s.query(Record)
-            .filter_by(user=user_id, habit=habit_id, date=date)
-            .one_or_none()
+        return s.execute(record_on_date(user_id, habit_id, date)).scalar_one_or_none()
+
+
+# The lookups above run on almost every update. They are lambda statements, so
+# SQLAlchemy builds and compiles each of them once per process, and later calls
+# only bind their new parameters. see benchmarks/bench_lookups.py
+
+
+def user_by_id(id):
+    return sqa.lambda_stmt(lambda: sqa.select(User).where(User.id == id))
+
+
+def habit_by_id(id):
+    return sqa.lambda_stmt(lambda: sqa.select(Habit).where(Habit.id == id))
+
+
+def method_by_id(id):
+    return sqa.lambda_stmt(lambda: sqa.select(Method).where(Method.id == id))
+
+
+def record_on_date(user_id, habit_id, date):
+    return sqa.lambda_stmt(
+        lambda: sqa.select(Record).where(
+            Record.user == user_id, Record.habit == habit_id, Record.date == date
         )
-        return record
+    )
+
+
+def get_habit_summaries(user_id):
+    """Returns streak and done days of all of user's habits, newest habit first.
+    Habits, methods and record dates are loaded in a single query, from the
+    replica, and every streak is calculated in memory from those dates."""
+    with ReadSession(user_id) as s:
+        rows = (
+            s.query(Habit.id, Habit.name, User.timezone, Method, Record.date)
+            .join(User, User.id == Habit.user)
+            .join(Method, Method.id == Habit.method)
+            .outerjoin(Record, Record.habit == Habit.id)
+            .filter(Habit.user == user_id)
+            .order_by(Habit.id.desc(), Record.date)
+            .all()
+        )
+    if not rows:
+        return []
+
+    today = date_in_timezone(rows[0].timezone)
+    week_start = first_day_of_duration(today, "week")
+    month_start = first_day_of_duration(today, "month")
+    # the database backend can only read records through a query.
+    backend = "memory" if calculator_backend == "database" else None
+
+    summaries = []
+    for habit_id, habit_rows in groupby(rows, key=lambda row: row.id):
+        habit_rows = list(habit_rows)
+        method = habit_rows[0].Method
+        dates = [row.date for row in habit_rows if row.date]
+        calculator = method.get_calculator(backend)(
+            records=None,
+            today_date=today,
+            dates=dates,
+            interval=method.interval,
+            duration=method.duration,
+            count=method.count,
+            specified_mask=method.specified_mask,
+        )
+        summaries.append(
+            {
+                "id": habit_id,
+                "name": habit_rows[0].name,
+                "duration": method.duration.code,
+                "streak": calculator.streak(),
+                "done_this_week": sum(date >= week_start for date in dates),
+                "done_this_month": sum(date >= month_start for date in dates),
+                "total_done_days": len(dates),
+            }
+        )
+    return summaries
 
 
 ##### Edit #####
@@ -121,14 +335,23 @@ def edit_habit(habit, new_name=None, new_method=None):
             habit = habit.id
 
         if new_name:
-            s.query(Habit).filter_by(id=habit).update({"name": new_name})
+            s.query(Habit).filter_by(id=habit).update(
+                {"name": new_name, "normalized_name": normalize_name(new_name)}
+            )
+        unused = []
         if new_method:
             old_method_id = s.query(Habit).filter_by(id=habit).one().method
-            new_method = new_method.id if type(new_method) == Method else new_method
-            s.query(Habit).filter_by(id=habit).update({"method": new_method})
-            s.query(Method).filter_by(id=old_method_id).delete()
+            if type(new_method) == Method:
+                new_method = insert_method(s, new_method)
+            if new_method != old_method_id:
+                s.query(Habit).filter_by(id=habit).update({"method": new_method})
+                s.query(StreakState).filter_by(habit=habit).update({"stale": True})
+                unused = delete_unused_methods(s, [old_method_id])
 
         s.commit()
+        forget_timeline(habit)
+        cache.habits.invalidate(habit)
+        forget_methods(unused)
 
 
 ##### Delete #####
@@ -137,7 +360,10 @@ def edit_habit(habit, new_name=None, new_method=None):
 def delete_record(record):
     with Session() as s:
         s.delete(record)
+        update_streak_state(s, record.habit, record.date, added=False)
         s.commit()
+        wrote(record.user)
+        forget_timeline(record.habit)
 
 
 def delete_habit(habit, delete_records=True, delete_method=True):
@@ -147,14 +373,58 @@ def delete_habit(habit, delete_records=True, delete_method=True):
             records.delete(synchronize_session=False) if records.count() else None
 
         method_id = habit.method
+        habit_id = habit.id
+        s.query(StreakState).filter_by(habit=habit.id).delete()
         habit = s.query(Habit).filter_by(id=habit.id).one_or_none()
         s.delete(habit)
+        # other habits can share the method.
+        unused = delete_unused_methods(s, [method_id]) if delete_method else []
         s.commit()
+        wrote(habit.user)
+        forget_timeline(habit_id)
+        cache.habits.invalidate(habit_id)
+        forget_methods(unused)
+
+
+def count_user_records(user_id):
+    with Session() as s:
+        return s.query(Record).filter_by(user=user_id).count()
 
-        if delete_method:
-            method = s.query(Method).filter_by(id=method_id)
-            method.delete(synchronize_session=False) if method.count() else None
+
+def delete_user_data(user_id, progress=None, batch_size=5000):
+    """Deletes the user with all of their habits, records, streaks and the methods
+    no other user shares, in a single transaction. Records are deleted batch_size at a time, and
+    progress(deleted records, all records) is called after every batch."""
+    with Session() as s:
+        habits = s.query(Habit.id, Habit.method).filter_by(user=user_id).all()
+        habit_ids = [habit.id for habit in habits]
+        method_ids = [habit.method for habit in habits if habit.method]
+        record_ids = [
+            id
+            for (id,) in s.query(Record.id).filter_by(user=user_id).order_by(Record.id)
+        ]
+
+        s.query(StreakState).filter(StreakState.habit.in_(habit_ids)).delete(
+            synchronize_session=False
+        )
+        for i in range(0, len(record_ids), batch_size):
+            batch = record_ids[i : i + batch_size]
+            s.query(Record).filter(
+                Record.user == user_id, Record.id.between(batch[0], batch[-1])
+            ).delete(synchronize_session=False)
+            if progress:
+                progress(i + len(batch), len(record_ids))
+        s.query(Habit).filter_by(user=user_id).delete(synchronize_session=False)
+        unused = delete_unused_methods(s, method_ids)
+        s.query(User).filter_by(id=user_id).delete(synchronize_session=False)
         s.commit()
+    wrote(user_id)
+
+    cache.users.invalidate(user_id)
+    for habit in habits:
+        cache.habits.invalidate(habit.id)
+        forget_timeline(habit.id)
+    forget_methods(unused)
 
 
 def delete_user(user_id):
@@ -162,3 +432,81 @@ def delete_user(user_id):
         user = s.query(User).filter_by(id=user_id)
         user.delete(synchronize_session=False) if user.count() else None
         s.commit()
+        cache.users.invalidate(user_id)
+
+
+def forget_timeline(habit_id):
+    """Forgets a habit's timeline now, and again when the session scope commits."""
+    timeline.invalidate(habit_id)
+    after_commit(lambda: timeline.invalidate(habit_id))
+
+
+##### Methods #####
+
+
+def method_is_used():
+    return sqa.exists().where(Habit.method == Method.id)
+
+
+def delete_unused_methods(s, method_ids):
+    """Deletes the methods of method_ids that no habit uses, in session s.
+    Returns (id, definition) of the deleted methods, see forget_methods()."""
+    s.flush()
+    unused = (
+        s.query(Method.id, Method.definition)
+        .filter(Method.id.in_(method_ids), ~method_is_used())
+        .all()
+    )
+    if unused:
+        s.query(Method).filter(
+            Method.id.in_([method.id for method in unused]), ~method_is_used()
+        ).delete(synchronize_session=False)
+    return unused
+
+
+def forget_methods(methods):
+    """Removes deleted methods from the caches, once their deletion is committed."""
+    for id, definition in methods:
+        cache.methods.invalidate(id)
+        cache.method_ids.invalidate(definition)
+
+
+def collect_unused_methods(batch_size=1000):
+    """Deletes every method that no habit uses, like the ones left by habits that
+    were never created. Deletes batch_size at a time, each batch in a transaction
+    of its own. Returns how many were deleted."""
+    deleted = 0
+    while True:
+        with Session() as s:
+            ids = [
+                id
+                for (id,) in s.query(Method.id)
+                .filter(~method_is_used())
+                .order_by(Method.id)
+                .limit(batch_size)
+            ]
+            unused = delete_unused_methods(s, ids) if ids else []
+            s.commit()
+        forget_methods(unused)
+        deleted += len(unused)
+        if len(ids) < batch_size:
+            return deleted
+
+
+##### Streaks #####
+
+
+def update_streak_state(s, habit_id, date, added):
+    """Applies an added or removed record to the habit's streak state, in session s.
+    Does nothing if the streak hasn't been calculated yet."""
+    row = (
+        s.query(StreakState, Method, User.timezone)
+        .join(Habit, Habit.id == StreakState.habit)
+        .join(Method, Method.id == Habit.method)
+        .join(User, User.id == Habit.user)
+        .filter(StreakState.habit == habit_id)
+        .one_or_none()
+    )
+    if row:
+        state, method, timezone = row
+        state.update(date, method, date_in_timezone(timezone), added)
@@ -3,7 +3,8 @@ from telegram.ext.callbackqueryhandler import CallbackQueryHandler
 from telegram.ext.commandhandler import CommandHandler
 from telegram.inline.inlinekeyboardbutton import InlineKeyboardButton
 from telegram.inline.inlinekeyboardmarkup import InlineKeyboardMarkup
-from controllers.crud import get_user, delete_habit, delete_user
+from base import logger
+from controllers.crud import count_user_records, delete_user_data
 from controllers.base import Conversation
 from controllers.mainkeys import deletemydata
 from controllers.ptbshortcuts import send_message, get_from_user
@@ -27,6 +28,19 @@ class DeleteMyData(Conversation):
         self.name = "Delete My Data"
         self.create_handler()
 
+        # accounts with more records than this are deleted in the background.
+        self.background_threshold = 5000
+        # a background deletion that fails is tried this many times in all,
+        # retry_delay seconds apart.
+        self.deletion_attempts = 3
+        self.retry_delay = 60
+        self.goodbye_text = (
+            "All of your data has been deleted.\n"
+            "If you ever want to come back, just click on /start.\n"
+            "\n"
+            "Bye! 👋"
+        )
+
     def add_keys(self):
         super().add_keys()
         self.keys.id = deletemydata
@@ -58,19 +72,90 @@ class DeleteMyData(Conversation):
         return self.keys.answer1
 
     def delete_everything(self, update, context):
-        user = get_user(get_from_user(update).id)
-        user_habits = user.get_habits()
-        for habit in user_habits:
-            delete_habit(habit, delete_records=True)
-        delete_user(user.id)
-        return self.say_goodbye(update, context)
+        user_id = get_from_user(update).id
+        if count_user_records(user_id) <= self.background_threshold:
+            delete_user_data(user_id)
+            return self.say_goodbye(update, context)
+        return self.delete_in_background(update, context, user_id)
 
-    def say_goodbye(self, update, context):
-        text = (
-            "All of your data has been deleted.\n"
-            "If you ever want to come back, just click on /start.\n"
-            "\n"
-            "Bye! 👋"
+    def delete_in_background(self, update, context, user_id):
+        """Big accounts are deleted by a job, that shows its progress in a message."""
+        message = send_message(update, self.progress_text(0))
+        context.job_queue.run_once(
+            self.deletion_job,
+            0,
+            context={
+                "user_id": user_id,
+                "chat_id": message.chat_id,
+                "message_id": message.message_id,
+                "attempt": 1,
+            },
+            name=f"{self.keys.id}:{user_id}",
         )
-        send_message(update, text)
+        return self.keys.end
+
+    def deletion_job(self, context):
+        """Deletes the user's data, and tries again later if that fails."""
+        job = context.job.context
+        last_percent = [0]
+
+        def edit(text):
+            # a message that can't be edited must not abort or fail the deletion.
+            try:
+                context.bot.edit_message_text(
+                    text, chat_id=job["chat_id"], message_id=job["message_id"]
+                )
+            except Exception:
+                logger.warning(
+                    msg=f"Editing the deletion message of user {job['user_id']} "
+                    "failed:",
+                    exc_info=True,
+                )
+
+        def progress(deleted, total):
+            percent = deleted * 100 // total
+            if percent - last_percent[0] >= 10:
+                last_percent[0] = percent
+                edit(self.progress_text(percent))
+
+        try:
+            delete_user_data(job["user_id"], progress=progress)
+        except Exception:
+            logger.error(
+                msg=f"Deleting the data of user {job['user_id']} failed:", exc_info=True
+            )
+            if job["attempt"] >= self.deletion_attempts:
+                edit(self.failed_text())
+                return
+            edit(self.retry_text())
+            context.job_queue.run_once(
+                self.deletion_job,
+                self.retry_delay,
+                context={**job, "attempt": job["attempt"] + 1},
+                name=context.job.name,
+            )
+            return
+        edit(self.goodbye_text)
+
+    def progress_text(self, percent):
+        # nothing is deleted until all of it is, in one transaction.
+        return (
+            f"🗑 Deleting your data... {percent}%\n"
+            "Nothing is removed until this is done."
+        )
+
+    def retry_text(self):
+        return (
+            "Something went wrong, and none of your data was deleted.\n"
+            f"I'll try again in {self.retry_delay} seconds."
+        )
+
+    def failed_text(self):
+        return (
+            "Sorry, something went wrong, and none of your data was deleted.\n"
+            f"Please try again later with /{deletemydata}."
+        )
+
+    def say_goodbye(self, update, context):
+        send_message(update, self.goodbye_text)
         return self.keys.end
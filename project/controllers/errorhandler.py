@@ -4,11 +4,14 @@ import traceback
 import os
 from telegram import Update
 from telegram.ext import CallbackContext
-from base import logger
+from base import logger, end_scope
 
 
 def error_handler(update: object, context: CallbackContext) -> None:
     """Log the error and send a telegram message to notify the developer."""
+    # Nothing the failed handler wrote to the database is kept.
+    end_scope(commit=False)
+
     # Log the error before we do anything else, so we can see it even if something breaks.
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
@@ -91,7 +91,7 @@ class HabitCreator(Conversation):
 
     def save(self, update, context):
         method = create_method(**context.user_data.get("method"))
-        habit = create_habit(self.habit_name, self.user_id, method.id)
+        habit = create_habit(self.habit_name, self.user_id, method)
 
         text = (
             "All done!\n"
@@ -7,6 +7,7 @@ create = "create"
 edit_timezone = "edit_timezone"
 deletemydata = "delete_my_data"
 feedback = "feedback"
+backfill = "backfill"
 
 # other start keys
 timezone = "timezone"
@@ -112,8 +112,10 @@ class Manager(ChooseHabitMixin, Conversation):
         return self.keys.answer3
 
     def habit_exists(self, name):
+        """True if another habit of the user has this name. Changing only the case
+        of the habit's own name is allowed."""
         habit = get_habit_by_name(name, self.user.id)
-        return bool(habit)
+        return bool(habit) and habit.id != self.habit.id
 
     def get_method(self, update, context):
         method = context.user_data.get("method")
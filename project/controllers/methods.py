@@ -284,7 +284,9 @@ class Specified(MethodConversation):
         if update.callback_query.data == self.keys.done:
             return self.pressed_done(update, context)
         choice = update.callback_query.data
-        context.user_data.get("method")["specified"] = self.update_days(context, choice)
+        context.user_data.get("method")["specified_mask"] = self.update_days(
+            context, choice
+        )
         self.update_buttons(choice)
         text = f"You can choose as many days as you want. when you're done, click Done."
         keyboard = InlineKeyboardMarkup(self.buttons)
@@ -292,7 +294,7 @@ class Specified(MethodConversation):
         return self.keys.answer2
 
     def pressed_done(self, update, context):
-        if context.user_data.get("method").get("specified"):
+        if context.user_data.get("method").get("specified_mask"):
 
             return self.end(update, context)
         text = "❌ You must choose at least one day."
@@ -343,10 +345,7 @@ class Specified(MethodConversation):
         return
 
     def update_days(self, context, choice):
-        days = context.user_data.get("method").get("specified", list())
+        "Toggles the chosen day in the method's bitmask of days. returns the mask."
+        mask = context.user_data.get("method").get("specified_mask", 0)
         clean_choice = int(choice.replace("day", ""))
-        if clean_choice in days:
-            days.remove(clean_choice)
-        else:
-            days.append(clean_choice)
-        return days
+        return mask ^ (1 << (clean_choice - 1))
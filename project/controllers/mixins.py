@@ -1,6 +1,6 @@
 from telegram.inline.inlinekeyboardbutton import InlineKeyboardButton
 from telegram.inline.inlinekeyboardmarkup import InlineKeyboardMarkup
-from controllers import crud
+from controllers import acrud
 from telegram.ext import CallbackQueryHandler
 from controllers.ptbshortcuts import send_message, get_from_user
 
@@ -32,16 +32,15 @@ class ChooseHabitMixin:
     def get_habit(self, update, context):
         "Sets self.habit and self.user. returns update and context."
         user_id, habit_id = map(int, update.callback_query.data.split(":"))
-        self.habit = crud.get_habit(habit_id, user_id)
-        self.user = crud.get_user(user_id)
+        self.habit, self.user = acrud.run(
+            acrud.gather(acrud.get_habit(habit_id, user_id), acrud.get_user(user_id))
+        )
         if not self.habit:
             return self.wrong_habit(update, context)
         return update, context
 
     def get_habit_keyboard(self, user_id):
-
-        user = crud.get_user(user_id)
-        user_habits = user.get_habits()
+        user_habits = acrud.run(acrud.get_user_habits(user_id))
         if not user_habits:
             return None
         self.create_habit_buttons(user_habits)
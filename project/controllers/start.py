@@ -11,6 +11,7 @@ from controllers.manager import Manager
 from controllers.deletemydata import DeleteMyData
 from controllers.stats import Stats
 from controllers.feedback import Feedback
+from controllers.backfill import Backfill
 
 
 habitcreator = HabitCreator()
@@ -20,6 +21,7 @@ manager = Manager()
 deletemydata = DeleteMyData()
 stats = Stats()
 feedback = Feedback()
+backfill = Backfill()
 
 
 class Start(Conversation):
@@ -38,6 +40,7 @@ class Start(Conversation):
                 deletemydata.handler,
                 stats.handler,
                 feedback.handler,
+                backfill.handler,
                 CommandHandler("start", self.start),
                 # 👆 so that user can run /start after deleting all.
                 # 👇 so that user can run shortcut commands.
@@ -48,6 +51,7 @@ class Start(Conversation):
                 CommandHandler(deletemydata.keys.id, deletemydata.handler),
                 CommandHandler(stats.keys.id, stats.handler),
                 CommandHandler(feedback.keys.id, feedback.handler),
+                CommandHandler(backfill.keys.id, backfill.handler),
             ],
             self.keys.ask_timezone: [
                 CallbackQueryHandler(self.ask_timezone, pattern=self.keys.ask_timezone),
@@ -5,7 +5,8 @@ from telegram.inline.inlinekeyboardbutton import InlineKeyboardButton
 from controllers.base import Conversation
 from controllers.mixins import ChooseHabitMixin
 from controllers.mainkeys import stats
-from controllers.crud import get_method
+from controllers.crud import get_habit_summaries
+from controllers.ptbshortcuts import get_from_user
 
 
 class Stats(ChooseHabitMixin, Conversation):
@@ -16,6 +17,8 @@ class Stats(ChooseHabitMixin, Conversation):
             CallbackQueryHandler(self.ask_habit, pattern=self.keys.id),
         ]
         self.states = self.choose_habit_states | {
+            self.choose_habit_key: self.choose_habit_states[self.choose_habit_key]
+            + [CallbackQueryHandler(self.summary, pattern=self.keys.summary)],
             self.keys.redo: [
                 CallbackQueryHandler(self.ask_habit, pattern=self.keys.redo),
                 self.main_menu_callback_state,
@@ -28,6 +31,7 @@ class Stats(ChooseHabitMixin, Conversation):
         super().add_keys()
         self.keys.id = stats
         self.keys.redo = self.keys.id + "redo"
+        self.keys.summary = self.keys.id + "summary"
 
     def ask_habit(self, update, context):
         if self.user_doesnt_exist(update):
@@ -35,9 +39,20 @@ class Stats(ChooseHabitMixin, Conversation):
         self.choose_habit_text = "Choose a habit to see a summary of your stats. 📊"
         return super().ask_habit(update, context)
 
+    def get_habit_keyboard(self, user_id):
+        keyboard = super().get_habit_keyboard(user_id)
+        if not keyboard:
+            return None
+        summary_button = InlineKeyboardButton(
+            "📋 All habits", callback_data=self.keys.summary
+        )
+        self.habit_buttons.insert(-1, [summary_button])
+        return InlineKeyboardMarkup(self.habit_buttons)
+
     def get_habit(self, update, context):
         update_, context_ = super().get_habit(update, context)
-        if self.habit.has_logs:
+        self.snapshot = self.habit.snapshot()
+        if self.snapshot.has_logs:
             return self.prepare_stats(update_, context_)
         return self.no_stats(update_, context_)
 
@@ -57,18 +72,50 @@ class Stats(ChooseHabitMixin, Conversation):
             return f"{num} {unit}"
         return f"{num} {unit}s"
 
+    def streak_dates(self, longest):
+        if not longest.length:
+            return ""
+        return f"<em>     {longest.start:%d %b %Y} - {longest.end:%d %b %Y}</em>\n"
+
+    def summary(self, update, context):
+        summaries = get_habit_summaries(get_from_user(update).id)
+        text = "<b> 📋 All habits</b>\n"
+        for habit in summaries:
+            text += (
+                "\n"
+                f"<b>{habit['name']}</b>: "
+                f"{self.num_with_unit(habit['streak'], habit['duration'])} streak\n"
+                f"<em>     This week: {self.num_with_unit(habit['done_this_week'],'day')}, "
+                f"this month: {self.num_with_unit(habit['done_this_month'],'day')}, "
+                f"total: {self.num_with_unit(habit['total_done_days'],'day')}</em>\n"
+            )
+
+        button = [
+            InlineKeyboardButton("Choose another habit", callback_data=self.keys.redo)
+        ]
+        keyboard = InlineKeyboardMarkup([button, self.main_menu_button])
+        update.callback_query.edit_message_text(
+            text, reply_markup=keyboard, parse_mode="HTML"
+        )
+        return self.keys.redo
+
     def prepare_stats(self, update, context):
-        streak_unit = get_method(self.habit.method).duration
+        "Shows self.snapshot, the stats of the chosen habit."
+        snapshot = self.snapshot
+        streak_unit = snapshot.duration
+        longest = snapshot.longest_streak
 
         text = (
-            f"<b> 📊 {self.habit.name}</b>\n"
+            f"<b> 📊 {snapshot.name}</b>\n"
             "\n"
-            f"<b>✅ Current Streak: {self.num_with_unit(self.habit.streak,streak_unit)}</b>\n"
+            f"<b>✅ Current Streak: {self.num_with_unit(snapshot.streak,streak_unit)}</b>\n"
+            f"<b>🏆 Longest Streak: {self.num_with_unit(longest.length,streak_unit)}</b>\n"
+            f"{self.streak_dates(longest)}"
             "\n"
             "<b>✅ Done Days:</b>\n"
-            f"<em>     - This week: {self.num_with_unit(self.habit.done_this_week,'day')}</em>\n"
-            f"<em>     - This month: {self.num_with_unit(self.habit.done_this_month,'day')}</em>\n"
-            f"<em>     - Total: {self.num_with_unit(self.habit.total_done_days,'day')}</em>\n"
+            f"<em>     - This week: {self.num_with_unit(snapshot.done_this_week,'day')}</em>\n"
+            f"<em>     - This month: {self.num_with_unit(snapshot.done_this_month,'day')}</em>\n"
+            f"<em>     - Total: {self.num_with_unit(snapshot.total_done_days,'day')}</em>\n"
             "\n"
             "<em>Notes:\n"
             "For now, I only work with Gregorian calendar, and assume week start day is Monday.</em>"
@@ -84,9 +131,7 @@ class Stats(ChooseHabitMixin, Conversation):
             )
 
         keyboard = InlineKeyboardMarkup([self.main_menu_button])
-        print("here")
         update.callback_query.edit_message_text(
             text, reply_markup=keyboard, parse_mode="HTML"
         )
-        print("or here?")
         return self.keys.main_menu
@@ -0,0 +1,186 @@
+"""Database engine, connection pool settings and pool statistics.
+
+The pool of databases other than SQLite is configured with these env variables:
+    db_pool_size:       connections kept open (default 5)
+    db_max_overflow:    connections opened on top of those under load (default 10)
+    db_pool_timeout:    seconds to wait for a connection before failing (default 30)
+    db_pool_recycle:    seconds after which a connection is replaced, so that the
+                        database doesn't close it for being idle first (default 3600)
+    db_pool_pre_ping:   test connections before using them (default true)
+
+SQLite databases, in a file or :memory:, need no server. They are set up with the
+pragmas in SQLITE_PRAGMAS.
+
+controllers.acrud uses an asyncio engine of the same database, with the driver in
+ASYNC_DRIVERS, if that driver is installed.
+"""
+
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:  # needs greenlet
+    create_async_engine = None
+
+# set on every new SQLite connection.
+SQLITE_PRAGMAS = [
+    "journal_mode=WAL",  # readers don't wait for writers. ignored by :memory:
+    "synchronous=NORMAL",  # safe with WAL, and only syncs on checkpoints
+    "foreign_keys=ON",  # like MySQL and Postgres
+    "busy_timeout=5000",  # wait for other writers instead of failing
+    "temp_store=MEMORY",
+]
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "mysql": "asyncmy", "postgresql": "asyncpg"}
+
+
+def create_database_engine(db_url, environ):
+    """Creates the engine of the database at db_url, with the pool settings of
+    environ, and the SQLite pragmas if it is SQLite."""
+    engine = create_engine(db_url, echo=False, **engine_options(db_url, environ))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def create_async_database_engine(db_url, environ):
+    """Creates an asyncio engine of the database at db_url, or returns None if its
+    async driver is not installed."""
+    url = async_url(db_url)
+    if url is None or create_async_engine is None:
+        return None
+    options = engine_options(db_url, environ)
+    options.pop("poolclass", None)  # asyncio engines need a pool of their own
+    try:
+        engine = create_async_engine(url, echo=False, **options)
+    except ImportError:
+        return None
+    if url.get_backend_name() == "sqlite":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def async_url(db_url):
+    """Returns the url of db_url's database with its driver in ASYNC_DRIVERS.
+    Returns None for in-memory SQLite, which another engine can't open."""
+    if is_sqlite_memory(db_url):
+        return None
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return None
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+
+
+def is_sqlite_memory(db_url):
+    return db_url in ["sqlite://", "sqlite:///:memory:"]
+
+
+def engine_options(db_url, environ):
+    """create_engine() keyword arguments for the database at db_url."""
+    if is_sqlite_memory(db_url):
+        # every connection to :memory: has a database of its own, so all threads
+        # share a single connection.
+        return {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+        }
+    if db_url.startswith("sqlite"):
+        # SQLite opens files, and doesn't use a QueuePool.
+        return {}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(environ.get("db_pool_size", 5)),
+        "max_overflow": int(environ.get("db_max_overflow", 10)),
+        "pool_timeout": float(environ.get("db_pool_timeout", 30)),
+        "pool_recycle": int(environ.get("db_pool_recycle", 3600)),
+        "pool_pre_ping": environ.get("db_pool_pre_ping", "true").lower()
+        in ["1", "true", "yes"],
+    }
+
+
+class PoolStats:
+    """Counts connection checkouts, including the ones that timed out, and how long
+    they waited for a connection."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def add_checkout(self, wait, timed_out=False):
+        with self.lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that keeps PoolStats of its checkouts in self.stats."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.stats.add_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.add_checkout(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def pool_status(engine):
+    """Returns a dict of the engine's pool statistics. Pools that aren't a
+    TimedQueuePool only report their class."""
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if not isinstance(pool, TimedQueuePool):
+        return status
+    stats = pool.stats
+    with stats.lock:
+        status |= {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "average_wait_ms": stats.total_wait / max(stats.checkouts, 1) * 1000,
+            "max_wait_ms": stats.max_wait * 1000,
+        }
+    return status
+
+
+def format_pool_status(status):
+    return ", ".join(
+        f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in status.items()
+    )
@@ -0,0 +1,181 @@
+"""Day-bitmap streak calculators.
+
+A habit's records are turned into a dense array with one item per day, and every
+week/month is checked with vectorized numpy operations instead of walking back
+one duration at a time. Results are the same as the reference calculators'.
+
+numpy is optional. Without it, the "bitmap" backend is not registered.
+"""
+
+import datetime
+
+from models.models import (
+    InMemoryMixin,
+    IntervalCalculator,
+    CountCalculator,
+    SpecifiedCalculator,
+    calculator_backends,
+    week,
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def days_since_epoch(date):
+    return (date - EPOCH).days
+
+
+class DayBitmapMixin(InMemoryMixin):
+    """Keeps done dates as a uint8 bitmap. Item 0 is self.origin (days since epoch),
+    the last item is today."""
+
+    def build_bitmap(self, first_day):
+        self.origin = days_since_epoch(first_day)
+        self.today_index = days_since_epoch(self.today) - self.origin
+        self.bitmap = np.zeros(self.today_index + 1, dtype=np.uint8)
+        # much faster than letting numpy convert the date objects to datetime64.
+        done = np.fromiter(
+            (date.toordinal() for date in self.sorted_dates),
+            dtype=np.int64,
+            count=len(self.sorted_dates),
+        )
+        done -= EPOCH.toordinal() + self.origin
+        self.bitmap[done[(done >= 0) & (done <= self.today_index)]] = 1
+
+    def bucket_starts(self):
+        """Days since epoch of every week/month start, from the one holding the oldest
+        record to the one holding today."""
+        if self.duration == week:
+            first = self.oldest_done_date - datetime.timedelta(
+                days=self.oldest_done_date.isoweekday() - 1
+            )
+            return np.arange(
+                days_since_epoch(first), days_since_epoch(self.today) + 1, 7
+            )
+
+        months = np.arange(
+            np.datetime64(self.oldest_done_date, "M"),
+            np.datetime64(self.today, "M") + 1,
+        )
+        return months.astype("datetime64[D]").astype(np.int64)
+
+    def day_nums(self, first, last):
+        """Number of each day between first and last (days since epoch) in its
+        week (monday=1) or month."""
+        days = np.arange(first, last + 1)
+        if self.duration == week:
+            return (days + 3) % 7 + 1  # 1970-01-01 was a thursday.
+        dates = days.astype("datetime64[D]")
+        return (dates - dates.astype("datetime64[M]").astype("datetime64[D]")).astype(
+            np.int64
+        ) + 1
+
+    @staticmethod
+    def unbroken_durations(durations_ok):
+        """Number of True values at the end of durations_ok, before the first False."""
+        failed = np.flatnonzero(~durations_ok[::-1])
+        return int(failed[0]) if failed.size else len(durations_ok)
+
+
+class BitmapIntervalCalculator(DayBitmapMixin, IntervalCalculator):
+    def streak(self):
+        if not self.oldest_done_date:
+            return 0
+        self.build_bitmap(self.oldest_done_date)
+        window = self.bitmap[-(self.interval + 1) :][::-1]
+        if not window.any():
+            return 0
+        anchor = self.today_index - int(np.argmax(window))
+        steps = self.bitmap[anchor :: -self.interval].astype(bool)
+        return self.unbroken_durations(steps[::-1])
+
+
+class BitmapCountCalculator(DayBitmapMixin, CountCalculator):
+    def streak(self):
+        if not self.oldest_done_date:
+            return 0
+        starts = self.bucket_starts()
+        self.build_bitmap(EPOCH + datetime.timedelta(days=int(starts[0])))
+        dones = np.add.reduceat(self.bitmap, starts - self.origin, dtype=np.int64)
+
+        streak = int(dones[-1] >= self.count)
+        if len(starts) == 1:
+            return streak
+        middle_ok = dones[1:-1] >= self.count
+        unbroken = self.unbroken_durations(middle_ok)
+        if unbroken < len(middle_ok):
+            return streak + unbroken
+
+        oldest_days = int(starts[1]) - days_since_epoch(self.oldest_done_date)
+        if oldest_days >= self.count:
+            oldest_ok = dones[0] >= self.count
+        else:
+            oldest_ok = dones[0] == oldest_days
+        return streak + unbroken + int(oldest_ok)
+
+    def total_loggable_days(self):
+        starts = self.bucket_starts()
+        today = days_since_epoch(self.today)
+        loggable_days = min(self.count, today - int(starts[-1]) + 1)
+        if len(starts) == 1:
+            return loggable_days
+        oldest_days = int(starts[1]) - days_since_epoch(self.oldest_done_date)
+        loggable_days += self.count * (len(starts) - 2)
+        return loggable_days + min(self.count, oldest_days)
+
+
+class BitmapSpecifiedCalculator(DayBitmapMixin, SpecifiedCalculator):
+    def streak(self):
+        if not self.oldest_done_date:
+            return 0
+        starts = self.bucket_starts()
+        self.build_bitmap(EPOCH + datetime.timedelta(days=int(starts[0])))
+        first_days = starts - self.origin
+        last_days = np.append(first_days[1:] - 1, self.today_index)
+
+        # Goal dates are counted from the start of each week/month, so a month's
+        # 31st can fall in the next month, and is never done in its own month.
+        days = np.flatnonzero(np.right_shift(self.mask, np.arange(31)) & 1) + 1
+        goals = first_days[:, None] + days[None, :] - 1
+        in_duration = goals <= last_days[:, None]
+        done = (
+            self.bitmap[np.minimum(goals, self.today_index)].astype(bool) & in_duration
+        )
+
+        streak = 0
+        if self.mask.bit_length() <= self.todays_day_num:
+            streak += int(done[-1].all())
+        if len(starts) == 1:
+            return streak
+        unbroken = self.unbroken_durations(done[1:-1].all(axis=1))
+        if unbroken < len(starts) - 2:
+            return streak + unbroken
+
+        # goal dates before the oldest record are ignored in the oldest duration.
+        oldest_index = days_since_epoch(self.oldest_done_date) - self.origin
+        counted = goals[0] >= oldest_index
+        oldest_ok = not (counted & ~done[0]).any() and (counted & done[0]).any()
+        return streak + unbroken + int(oldest_ok)
+
+    def total_loggable_days(self):
+        today = days_since_epoch(self.today)
+        # the current week/month is counted from its start, even if it's the oldest.
+        first = min(
+            int(self.bucket_starts()[-1]), days_since_epoch(self.oldest_done_date)
+        )
+        day_nums = self.day_nums(first, today)
+        return int((np.right_shift(self.mask, day_nums - 1) & 1).sum())
+
+
+if np is not None:
+    calculator_backends["bitmap"] = {
+        "interval": BitmapIntervalCalculator,
+        "count": BitmapCountCalculator,
+        "specified": BitmapSpecifiedCalculator,
+    }
@@ -0,0 +1,174 @@
+"""Calendar arithmetic for loggable days.
+
+Counts days of a date range arithmetically instead of walking it one week/month
+at a time: full weeks and months are counted in O(1), and only the partial
+edges are looked at day by day (at most six days).
+
+Weeks start on monday, and days of the week are numbered like isoweekday().
+"""
+
+import datetime
+import math
+
+week = "week"
+month = "month"
+
+# months that have fewer than 29, 30 and 31 days. february is handled separately.
+SHORT_MONTHS = {29: [], 30: [], 31: [4, 6, 9, 11]}
+
+
+def days_in_range(start, end):
+    """Number of days between start and end, both included. 0 if end < start."""
+    return max((end - start).days + 1, 0)
+
+
+def first_day_of_duration(date, duration):
+    if duration == week:
+        return date - datetime.timedelta(days=date.isoweekday() - 1)
+    return date.replace(day=1)
+
+
+def day_number(date, duration):
+    """Number of date's day in its week (monday=1) or month."""
+    if duration == week:
+        return date.isoweekday()
+    return date.day
+
+
+# Specified days of a week/month are kept as a bitmask: bit n-1 is set for day n.
+def days_to_mask(days):
+    mask = 0
+    for day in days:
+        mask |= 1 << (day - 1)
+    return mask
+
+
+def mask_to_days(mask):
+    """The days set in mask, smallest first."""
+    days = []
+    while mask:
+        lowest = mask & -mask
+        days.append(lowest.bit_length())
+        mask ^= lowest
+    return days
+
+
+def dates_to_mask(dates, duration):
+    """Bitmask of the day numbers of dates, which are in the same week/month."""
+    mask = 0
+    for date in dates:
+        mask |= 1 << (day_number(date, duration) - 1)
+    return mask
+
+
+def month_index(date):
+    return date.year * 12 + date.month - 1
+
+
+def durations_in_range(start, end, duration):
+    """Number of weeks/months that have at least one day between start and end."""
+    if end < start:
+        return 0
+    if duration == week:
+        first = first_day_of_duration(start, week)
+        return (end - first).days // 7 + 1
+    return month_index(end) - month_index(start) + 1
+
+
+def leap_years_until(year):
+    """Number of leap years from year 1 to year."""
+    return year // 4 - year // 100 + year // 400
+
+
+def months_in_index_range(first, last, month_num):
+    """Number of months numbered month_num (1-12) between two month indexes."""
+    offset = month_num - 1
+    return (last - offset) // 12 - (first - 1 - offset) // 12
+
+
+def months_with_day(first, last, day):
+    """Number of months between two month indexes, both included, that have a day."""
+    months = last - first + 1
+    if day <= 28:
+        return months
+    short = sum(months_in_index_range(first, last, m) for m in SHORT_MONTHS[day])
+    februaries = months_in_index_range(first, last, 2)
+    if day == 29:
+        first_year = math.ceil((first - 1) / 12)
+        last_year = (last - 1) // 12
+        februaries -= leap_years_until(last_year) - leap_years_until(first_year - 1)
+    return months - short - februaries
+
+
+def date_exists(year, month_num, day):
+    try:
+        datetime.date(year, month_num, day)
+        return True
+    except ValueError:
+        return False
+
+
+def count_weekdays(start, end, weekdays):
+    """Number of days between start and end, both included, whose isoweekday()
+    is in weekdays."""
+    days = days_in_range(start, end)
+    full_weeks, extra_days = divmod(days, 7)
+    count = full_weeks * len(set(weekdays))
+    for i in range(extra_days):
+        if (start.isoweekday() + i - 1) % 7 + 1 in weekdays:
+            count += 1
+    return count
+
+
+def count_month_days(start, end, month_days):
+    """Number of days between start and end, both included, whose day of the
+    month is in month_days."""
+    if end < start:
+        return 0
+    first, last = month_index(start), month_index(end)
+    count = 0
+    for day in set(month_days):
+        count += months_with_day(first, last, day)
+        # the first and last months are only partly in range.
+        if day < start.day:
+            count -= 1
+        if day > end.day and date_exists(end.year, end.month, day):
+            count -= 1
+    return count
+
+
+##### Loggable days #####
+# These give the same results as the calculators' total_loggable_days().
+# Like those, the current week/month is counted from its first day, even if
+# the oldest record is in it.
+
+
+def interval_loggable_days(oldest, today, interval):
+    days_passed = days_in_range(oldest, today)
+    if days_passed < interval:
+        return 1
+    return math.ceil(days_passed / interval)
+
+
+def count_loggable_days(oldest, today, count, duration):
+    current_start = first_day_of_duration(today, duration)
+    loggable_days = min(count, days_in_range(current_start, today))
+    if oldest >= current_start:
+        return loggable_days
+
+    full_durations = durations_in_range(oldest, current_start, duration) - 2
+    oldest_end = first_day_of_duration(oldest, duration)
+    if duration == week:
+        oldest_end += datetime.timedelta(days=6)
+    else:
+        next_month = (oldest_end + datetime.timedelta(days=31)).replace(day=1)
+        oldest_end = next_month - datetime.timedelta(days=1)
+    oldest_days = days_in_range(oldest, oldest_end)
+    return loggable_days + count * full_durations + min(count, oldest_days)
+
+
+def specified_loggable_days(oldest, today, days, duration):
+    first = min(oldest, first_day_of_duration(today, duration))
+    if duration == week:
+        return count_weekdays(first, today, days)
+    return count_month_days(first, today, days)
@@ -1,9 +1,13 @@
+import bisect
+import importlib
 import math
+from collections import namedtuple
 
 from pytz import utc
 from base import Base
 from sqlalchemy import Column
 import sqlalchemy as sqa
+from sqlalchemy.orm import synonym
 from sqlalchemy.sql.schema import ForeignKey
 import datetime
 from base import Session
@@ -11,7 +15,12 @@ from sqlalchemy_utils.types.choice import ChoiceType
 from abc import ABC
 from datetime import timedelta
 from base import logger
-from base import Session
+from base import Session, ReadSession, after_commit
+from base import calculator_backend
+from models.calendarmath import first_day_of_duration
+from models.calendarmath import count_loggable_days, specified_loggable_days
+from models.calendarmath import day_number, dates_to_mask, days_to_mask, mask_to_days
+from models import timeline
 
 
 class User(Base):
@@ -43,25 +52,31 @@ class User(Base):
             return habits
 
     def habit_name_is_duplicate(self, habit_name):
-        lower_cased_name = habit_name.lower()
+        """True if the user has a habit with the same name, ignoring case."""
         with Session() as s:
-            habits = s.query(Habit.name).all()
-            for habit in habits:
-                if lower_cased_name == habit[0].lower():
-                    return True
-        return False
+            habit = (
+                s.query(Habit.id)
+                .filter_by(user=self.id, normalized_name=normalize_name(habit_name))
+                .first()
+            )
+        return habit is not None
 
 
 class Habit(Base):
     __tablename__ = "habits"
+    __table_args__ = (
+        sqa.Index("ix_habits_user_normalized_name", "user", "normalized_name"),
+    )
     id = Column(sqa.Integer, primary_key=True)
     name = Column(sqa.String(300))
+    normalized_name = Column(sqa.String(300))  # see normalize_name()
     user = Column(sqa.Integer, ForeignKey("users.id"))
     method = Column(sqa.Integer, ForeignKey("methods.id"))
     date_created = Column(sqa.Date)
 
     def __init__(self, name, user, method):
         self.name = name
+        self.normalized_name = normalize_name(name)
         self.user = user
         self.method = method
         self.date_created = self.today_in_timezone()
@@ -72,32 +87,41 @@ class Habit(Base):
 
     @property
     def records(self):
-        """Returns a query of habit's records, the first being the most recent."""
-        with Session() as s:
+        """Returns a query of habit's records, the first being the most recent.
+        Reads from the replica, see base.ReadSession."""
+        return self.query_records()
+
+    def query_records(self, primary=False):
+        """Like records, from the primary database if primary is true: reads whose
+        results are saved must not see a lagging replica."""
+        session = Session() if primary else ReadSession(self.user)
+        with session as s:
             records = (
                 s.query(Record).filter_by(habit=self.id).order_by(Record.date.desc())
             )
             return records
 
-    def get_method_calculator(self):
-        today_date = self.today_in_timezone()
-        with Session() as s:
-            method = s.query(Method).filter_by(id=self.method).one_or_none()
-            calculator = method.calculator(
-                today_date=today_date,
-                records=self.records,
-                interval=method.interval,
-                duration=method.duration,
-                count=method.count,
-                specified=method.specified_days,
-            )
+    def get_method_calculator(self, today=None, method=None, primary=False):
+        """today and the habit's method are read from the database if not given.
+        With primary, the calculator reads the records from the primary database."""
+        today_date = today or self.today_in_timezone()
+        if not method:
+            with Session() as s:
+                method = s.query(Method).filter_by(id=self.method).one_or_none()
+        calculator = method.calculator(
+            today_date=today_date,
+            records=self.query_records(primary),
+            interval=method.interval,
+            duration=method.duration,
+            count=method.count,
+            specified_mask=method.specified_mask,
+        )
         return calculator
 
     def today_in_timezone(self):
         with Session() as s:
             user = s.query(User).filter_by(id=self.user).one_or_none()
-        today = datetime.datetime.now(utc) + timedelta(hours=user.timezone)
-        return today.date()
+        return date_in_timezone(user.timezone)
 
     @property
     def total_done_days(self):
@@ -123,14 +147,140 @@ class Habit(Base):
 
     @property
     def streak(self):
-        if self.has_logs:
-            calculator = self.get_method_calculator()
-            return calculator.streak()
-        return 0
+        return self.current_streak(self.today_in_timezone())
+
+    def current_streak(self, today, method=None):
+        """Reads the streak from the habit's StreakState, and only recalculates it
+        if the state is missing or stale. The habit's method is read from the
+        database if it is needed and not given."""
+        with Session(expire_on_commit=False) as s:
+            state = s.query(StreakState).filter_by(habit=self.id).one_or_none()
+            if state and state.is_fresh(today):
+                return state.streak
+            if not state:
+                state = StreakState(habit=self.id)
+                s.add(state)
+            self.calculate_streak_state(state, today, method)
+            s.commit()
+            return state.streak
+
+    def calculate_streak_state(self, state, today, method=None):
+        if not method:
+            with Session() as s:
+                method = s.query(Method).filter_by(id=self.method).one_or_none()
+        # the state is saved, so it is calculated from the primary database.
+        state.streak = self.get_method_calculator(today, method, primary=True).streak()
+        state.duration_dones = 0
+        if method.type == "count":
+            duration_start = first_day_of_duration(today, method.duration)
+            state.duration_dones = (
+                self.query_records(primary=True)
+                .filter(duration_start <= Record.date, Record.date <= today)
+                .count()
+            )
+        state.evaluated_on = today
+        state.stale = False
+
+    def streak_timeline(self, today=None, method=None):
+        """Returns (timeline, longest streak) of the habit. see models.timeline.
+        today and the habit's method are read from the database if not given."""
+        today = today or self.today_in_timezone()
+        cached, generation = timeline.get_cached(self.id, today)
+        if cached:
+            return cached
+        if not method:
+            with Session() as s:
+                method = s.query(Method).filter_by(id=self.method).one_or_none()
+        result = timeline.streak_timeline(
+            RecordDates.load(self.records).dates,
+            today,
+            method.type,
+            method.duration,
+            interval=method.interval,
+            count=method.count,
+            specified_mask=method.specified_mask,
+        )
+        after_commit(lambda: timeline.set_cached(self.id, today, result, generation))
+        return result
+
+    @property
+    def longest_streak(self):
+        return self.streak_timeline()[1]
+
+    def snapshot(self):
+        """Returns a HabitSnapshot of the habit. Its done days, first and last
+        done date are counted in a single conditional aggregation query."""
+        with Session() as s:
+            timezone, method = (
+                s.query(User.timezone, Method)
+                .select_from(Habit)
+                .join(User, User.id == Habit.user)
+                .join(Method, Method.id == Habit.method)
+                .filter(Habit.id == self.id)
+                .one()
+            )
+        today = date_in_timezone(timezone)
+        total, this_week, this_month, first_done, last_done = (
+            self.records.order_by(None)
+            .with_entities(
+                sqa.func.count(Record.id),
+                count_since(first_day_of_duration(today, "week")),
+                count_since(first_day_of_duration(today, "month")),
+                sqa.func.min(Record.date),
+                sqa.func.max(Record.date),
+            )
+            .one()
+        )
+        return HabitSnapshot(
+            name=self.name,
+            duration=method.duration.code,
+            streak=self.current_streak(today, method),
+            longest_streak=self.streak_timeline(today, method)[1],
+            done_this_week=this_week,
+            done_this_month=this_month,
+            total_done_days=total,
+            first_done=first_done,
+            last_done=last_done,
+        )
+
+
+class HabitSnapshot(
+    namedtuple(
+        "HabitSnapshot",
+        [
+            "name",
+            "duration",
+            "streak",
+            "longest_streak",
+            "done_this_week",
+            "done_this_month",
+            "total_done_days",
+            "first_done",
+            "last_done",
+        ],
+    )
+):
+    """The stats of a habit at one moment, that the Stats screen shows."""
+
+    __slots__ = ()
+
+    @property
+    def has_logs(self):
+        return self.total_done_days > 0
+
+
+def count_since(date):
+    """Counts the records on or after date, in an aggregate query of records."""
+    done = sqa.case((Record.date >= date, 1), else_=0)
+    return sqa.func.coalesce(sqa.func.sum(done), 0)
 
 
 class Record(Base):
     __tablename__ = "records"
+    __table_args__ = (
+        sqa.Index("uq_records_habit_date", "habit", "date", unique=True),
+        sqa.Index("ix_records_user_habit_date", "user", "habit", "date"),
+    )
     id = Column(sqa.Integer, primary_key=True)
     user = Column(sqa.Integer, ForeignKey("users.id"))
     habit = Column(sqa.Integer, ForeignKey("habits.id"))
@@ -146,6 +296,45 @@ class Record(Base):
         return info
 
 
+class RecordDates:
+    """Everything calculators need from a habit's records: their count, the oldest
+    and newest date, and (when loaded) all dates sorted oldest first."""
+
+    def __init__(self, dates=None, count=0, oldest=None, newest=None):
+        self.dates = dates
+        self.count = count
+        self.oldest = oldest
+        self.newest = newest
+
+    @classmethod
+    def from_aggregate(cls, records):
+        """Reads count, oldest and newest date of a records query with a single
+        aggregate query, without loading any rows."""
+        count, oldest, newest = (
+            records.order_by(None)
+            .with_entities(
+                sqa.func.count(Record.id),
+                sqa.func.min(Record.date),
+                sqa.func.max(Record.date),
+            )
+            .one()
+        )
+        return cls(count=count, oldest=oldest, newest=newest)
+
+    @classmethod
+    def load(cls, records):
+        """Loads every date of a records query in a single query."""
+        dates = records.order_by(None).order_by(Record.date).with_entities(Record.date)
+        return cls.from_dates([date for (date,) in dates])
+
+    @classmethod
+    def from_dates(cls, dates):
+        dates = sorted(dates)
+        if not dates:
+            return cls(dates)
+        return cls(dates, len(dates), dates[0], dates[-1])
+
+
 class Method(Base):
     TYPES = [
         ("specified", "Specified Days"),
@@ -159,20 +348,25 @@ class Method(Base):
     ]
 
     __tablename__ = "methods"
+    __table_args__ = (sqa.Index("uq_methods_definition", "definition", unique=True),)
     id = Column(sqa.Integer, primary_key=True)
     type = Column(ChoiceType(TYPES))
     duration = Column(ChoiceType(DURATIONS))
-    # comma-separated list of day numbers (either in week, month, or year. in week, monday=1)
-    specified = Column(sqa.String(300), nullable=True)
+    # bitmask of day numbers in the week (monday=1) or month: bit n-1 is day n.
+    # replaced a comma-separated string column, see fill_specified_masks in run.py
+    specified_mask = Column(sqa.Integer, nullable=True)
+    specified = synonym("specified_mask")
     interval = Column(sqa.Integer, nullable=True)
     count = Column(sqa.Integer, nullable=True)
+    # methods are shared by all habits with the same definition. see method_definition()
+    definition = Column(sqa.String(100))
 
     def __init__(self, type, duration, *args, **kwargs):
         """
         types: specified, interval, count
         durations: day, week, month
         for type interval: add interval kw
-        for type specified: add specified
+        for type specified: add specified (a list of days) or specified_mask
         for type count: add count
 
         """
@@ -181,30 +375,111 @@ class Method(Base):
         self.interval = kwargs.get("interval")
         self.count = kwargs.get("count")
         if kwargs.get("specified"):
-            self.specified = self.convert_specified(kwargs.get("specified"))
-            print(f"converted is {self.specified}")
+            self.specified_mask = self.convert_specified(kwargs.get("specified"))
+        elif kwargs.get("specified_mask"):
+            self.specified_mask = kwargs.get("specified_mask")
+        self.definition = method_definition(
+            self.type, self.duration, self.interval, self.count, self.specified_mask
+        )
 
     @property
     def calculator(self):
-        method_calculators = {
-            "interval": IntervalCalculator,
-            "count": CountCalculator,
-            "specified": SpecifiedCalculator,
-        }
-        return method_calculators.get(self.type)
+        return self.get_calculator()
+
+    def get_calculator(self, backend=None):
+        """Returns the calculator class for this method's type.
+        backend is a key of calculator_backends. defaults to the one set in base."""
+        backend = backend or calculator_backend
+        if backend not in calculator_backends:
+            get_calculator_backends()
+        if backend in calculator_backends:
+            return calculator_backends[backend].get(self.type)
+        if backend in optional_calculator_backends:
+            raise ValueError(
+                f"The {backend} calculator backend needs "
+                f"{optional_calculator_backends[backend][1]}, which is not installed."
+            )
+        raise ValueError(
+            f"Unknown calculator backend {backend!r}. "
+            f"Use one of: {', '.join(calculator_backends)}."
+        )
 
     @property
     def specified_days(self):
-        """Converts comma seperated string of days to a list of integars."""
-        if self.specified:
-            str_list = self.specified.split(",")
-            return [int(day) for day in str_list]
-        return []
+        """Returns the list of specified days, smallest first."""
+        return mask_to_days(self.specified_mask or 0)
 
     def convert_specified(self, list_):
-        """Converts list of days to a comma seperated string."""
-        list_ = [str(day) for day in list_]
-        return ",".join(list_)
+        """Converts list of days to a bitmask."""
+        return days_to_mask(list_)
+
+
+class StreakState(Base):
+    """A habit's last calculated streak. It is updated when a record is added or
+    removed, so reading a streak doesn't need a recalculation. When a change can't
+    be applied without one, the state is marked as stale and recalculated on the
+    next read. It is also stale once the day it was calculated for has passed."""
+
+    __tablename__ = "streaks"
+    habit = Column(sqa.Integer, ForeignKey("habits.id"), primary_key=True)
+    streak = Column(sqa.Integer, default=0)
+    # done days in the current week/month. only kept for count methods.
+    duration_dones = Column(sqa.Integer, default=0)
+    evaluated_on = Column(sqa.Date)
+    stale = Column(sqa.Boolean, default=False)
+
+    def __init__(self, habit):
+        self.habit = habit
+        self.streak = 0
+        self.duration_dones = 0
+        self.stale = True
+
+    def is_fresh(self, today):
+        return not self.stale and self.evaluated_on == today
+
+    def update(self, date, method, today, added):
+        """Adds (or removes) a done date to the state, if that can be done without
+        recalculating the whole streak. Otherwise marks the state as stale.
+
+        Only changes to the current week/month of count methods, and to today for
+        everyday habits, can be applied directly; the rest of the streak is the same
+        as it was when the state was calculated."""
+        if not self.is_fresh(today):
+            self.stale = True
+            return
+        change = 1 if added else -1
+
+        duration_start = first_day_of_duration(today, method.duration)
+        if method.type == "count" and duration_start <= date <= today:
+            was_done = self.duration_dones >= method.count
+            self.duration_dones += change
+            is_done = self.duration_dones >= method.count
+            self.streak += int(is_done) - int(was_done)
+
+        elif method.type == "interval" and method.interval == 1 and date == today:
+            # today is the newest date that can start the streak, so it only
+            # extends (or shortens) the streak that ended yesterday.
+            self.streak += change
+
+        else:
+            self.stale = True
+
+
+def method_definition(type, duration, interval, count, specified_mask):
+    """The key that identical methods share, like "interval:day:1::"."""
+    values = [type, duration, interval, count, specified_mask]
+    values = [getattr(value, "code", value) for value in values]
+    return ":".join("" if value is None else str(value) for value in values)
+
+
+def normalize_name(name):
+    """Habit names are compared case-insensitively, by their normalized name."""
+    return name.strip().casefold()
+
+
+def date_in_timezone(timezone):
+    today = datetime.datetime.now(utc) + timedelta(hours=timezone)
+    return today.date()
 
 
 # --------- Method Calculators ---------
@@ -221,10 +496,13 @@ class MethodCalculator(ABC):
         self._streak = 0
         self.today = today_date
         self.records = records
-        self.oldest_done_date = records[-1].date if records.count() else None
+        self.oldest_done_date = self.get_oldest_done_date()
         self.duration_start = None
         self.duration_end = None
 
+    def get_oldest_done_date(self):
+        return RecordDates.from_aggregate(self.records).oldest
+
     def streak(self):
         pass
 
@@ -282,8 +560,11 @@ class IntervalCalculator(MethodCalculator):
     def __init__(self, records, today_date, *args, **kwargs):
         self.interval = kwargs.get("interval")
         self.duration = kwargs.get("duration")
-        self.done_dates = [record.date for record in records.all()]
         super().__init__(records, today_date)
+        self.done_dates = self.get_done_dates()
+
+    def get_done_dates(self):
+        return [record.date for record in self.records.all()]
 
     def check_date_and_go_one_interval_back(self, date):
         if date in self.done_dates:
@@ -336,7 +617,6 @@ class CountCalculator(MethodCalculator):
             return 0
         self.set_duration_start_end()
         logger.debug(f"duration start:{self.duration_start} end: {self.duration_end}")
-        print(f"{self.dones_in_duration()=}")
         if self.dones_in_duration() >= self.count:
             logger.debug("dones>=count")
             self._streak += 1
@@ -383,6 +663,9 @@ class CountCalculator(MethodCalculator):
     def duration_days_equal_or_more_than_count(self):
         return self.days_in_duration() >= self.count
 
+    def duration_days_less_than_count(self):
+        return self.days_in_duration() < self.count
+
     def total_loggable_days(self):
         loggable_days = 0
         self.set_duration_start_end()
@@ -408,11 +691,16 @@ class CountCalculator(MethodCalculator):
 
 class SpecifiedCalculator(MethodCalculator):
     def __init__(self, records, today_date, *args, **kwargs):
-        self.days = sorted(kwargs.get("specified"), reverse=True)
+        self.mask = kwargs.get("specified_mask")
 
         self.duration = kwargs.get("duration")
         super().__init__(records, today_date)
 
+    @property
+    def days(self):
+        """The specified days, smallest first."""
+        return mask_to_days(self.mask)
+
     def done_dates_in_duration(self):
         records = self.records.filter(
             self.duration_start <= Record.date, Record.date <= self.duration_end
@@ -437,10 +725,9 @@ class SpecifiedCalculator(MethodCalculator):
         if not self.oldest_done_date:
             return 0
         self.set_duration_start_end()
-        if max(self.days) <= self.todays_day_num:
-            logger.debug("max(self.days) <= self.today.isoweekday()")
+        if self.mask.bit_length() <= self.todays_day_num:
+            logger.debug("last specified day <= todays_day_num")
             # if its even possible to get a streak using normal methods from current month yet.
-            self.set_goal_dates()
             self._streak += self.one_duration_streak()
             logger.debug(f"streak for current duration is {self._streak}")
         if self.is_oldest_duration():
@@ -449,7 +736,6 @@ class SpecifiedCalculator(MethodCalculator):
 
         while True:
             self.go_back_a_duration()
-            self.set_goal_dates()
             if self.is_oldest_duration():
 
                 self._streak += self.oldest_duration_streak()
@@ -459,62 +745,21 @@ class SpecifiedCalculator(MethodCalculator):
                 return self._streak
             self._streak += 1
 
-    def set_goal_dates(self):
-        """Converts specified days to date objects in current week/month.
-        in case its the oldest duration, it uses first day of the week/month instead of duration start.
-        """
-        first = self.duration_start
-        if self.is_oldest_duration():
-            start_days = {
-                week: self.duration_end - timedelta(self.duration_end.isoweekday() - 1),
-                month: self.duration_end.replace(day=1),
-            }
-            first = start_days.get(self.duration, None)
-        logger.debug(f"{first=}")
-        self.goal_dates = [first + timedelta(day - 1) for day in self.days]
-        logger.debug(f"goal dates are {self.goal_dates}")
-
     def one_duration_streak(self):
         """Checks a single duration to see if it can add to streak. returns 0 or 1"""
-        logger.debug(f"----Getting one duration streak----")
-        done_dates = self.done_dates_in_duration()
-        logger.debug(f"{done_dates=}")
-        for day in self.goal_dates:
-            if day not in done_dates:
-                logger.debug(f"goal date {day} is not in done dates, returning 0")
-                return 0
-            logger.debug(f"goal date {day} is in done dates, continuing")
-
-        return 1
+        done = dates_to_mask(self.done_dates_in_duration(), self.duration)
+        return int(not self.mask & ~done)
 
     def oldest_duration_streak(self):
         """If a goal date was smaller than the oldest record available, it will be ignored.
         If all goal dates >= oldest record are marked as done, this duration will get a streak.
         Otherwise, will return zero."""
-        logger.debug("------OLDEST DURATION STREAK------")
-        done_dates = self.done_dates_in_duration()
-        logger.debug(f"{done_dates=}")
-        num_goal_dates_logged = 0  # to make sure at least one goal day is done.
-        for day in self.goal_dates:
-            logger.debug(f"checking goal date {day}")
-            if day >= self.duration_start:
-                logger.debug(f"goal date >= duration start (oldest record)")
-                if day in done_dates:
-                    logger.debug(f"goal date is in done dates. adding 1.")
-                    num_goal_dates_logged += 1
-                else:
-                    logger.debug(f"goal date not in done date. returning 0")
-                    return 0
-            else:
-                logger.debug(
-                    f"goal date smaller than duration start (oldest record). ignored."
-                )
-        if num_goal_dates_logged:
-            logger.debug(f"{num_goal_dates_logged=}, returning 1 streak")
-            return 1
-
-        logger.debug(f"{num_goal_dates_logged=}, returning 0 streak")
-        return 0
+        done = dates_to_mask(self.done_dates_in_duration(), self.duration)
+        # duration_start is the oldest record here.
+        ignored = day_number(self.duration_start, self.duration) - 1
+        goal = self.mask >> ignored << ignored
+        # at least one goal day must be done.
+        return int(bool(goal) and not goal & ~done)
 
     def total_loggable_days(self):
         loggable_days = 0
@@ -544,7 +789,11 @@ class SpecifiedCalculator(MethodCalculator):
         loggable_days = 0
         while True:
             for day in self.days:
-                if self.duration_start.weekday() <= day <= self.duration_end.weekday():
+                if (
+                    self.duration_start.isoweekday()
+                    <= day
+                    <= self.duration_end.isoweekday()
+                ):
                     loggable_days += 1
             if self.is_oldest_duration():
                 break
@@ -553,13 +802,9 @@ class SpecifiedCalculator(MethodCalculator):
 
     def days_are_normal(self):
         "To figure out if days 29 to 31 of months are in chosen days."
-        weird_days = [29, 30, 31]
         if self.duration == week:
             return True
-        for day in weird_days:
-            if day in self.days:
-                return False
-        return True
+        return not self.mask & days_to_mask([29, 30, 31])
 
     def date_is_valid(self, year, month, day):
         try:
@@ -570,7 +815,9 @@ class SpecifiedCalculator(MethodCalculator):
 
     def count_loggable_days_in_weird_days(self):
         loggable_days = 0
-        weird_days = [day if day in self.days else None for day in [29, 30, 31]]
+        weird_days = [
+            day if self.mask >> (day - 1) & 1 else None for day in [29, 30, 31]
+        ]
         self.set_duration_start_end()
         while True:
 
@@ -584,3 +831,108 @@ class SpecifiedCalculator(MethodCalculator):
             self.go_back_a_duration()
 
         return loggable_days
+
+
+# --------- In-memory Calculators ---------
+
+
+class InMemoryMixin:
+    """Loads the habit's record dates once, oldest first, and answers every
+    duration's questions from that list instead of querying the database.
+    Pass dates=[...] to skip the query entirely.
+    Must come before the calculator class it is mixed into."""
+
+    def __init__(self, records, today_date, *args, **kwargs):
+        dates = kwargs.pop("dates", None)
+        if dates is None:
+            self.record_dates = RecordDates.load(records)
+        else:
+            self.record_dates = RecordDates.from_dates(dates)
+        self.sorted_dates = self.record_dates.dates
+        super().__init__(records, today_date, *args, **kwargs)
+
+    def get_oldest_done_date(self):
+        return self.record_dates.oldest
+
+    def get_done_dates(self):
+        return self.sorted_dates
+
+    def count_between(self, start, end):
+        """Number of done dates between start and end, both included."""
+        low = bisect.bisect_left(self.sorted_dates, start)
+        high = bisect.bisect_right(self.sorted_dates, end)
+        return high - low
+
+    def dates_between(self, start, end):
+        """Done dates between start and end, both included."""
+        low = bisect.bisect_left(self.sorted_dates, start)
+        high = bisect.bisect_right(self.sorted_dates, end)
+        return self.sorted_dates[low:high]
+
+
+class InMemoryIntervalCalculator(InMemoryMixin, IntervalCalculator):
+    """Walks the streak back in a loop instead of recursing, checking every step
+    against a set of date ordinals. Linear in the streak's length, so it works for
+    streaks of any length."""
+
+    def get_done_dates(self):
+        self.done_ordinals = {date.toordinal() for date in self.sorted_dates}
+        return self.sorted_dates
+
+    def streak(self):
+        today = self.today.toordinal()
+        for i in range(self.interval + 1):
+            ordinal = today - i
+            if ordinal in self.done_ordinals:
+                while ordinal in self.done_ordinals:
+                    self._streak += 1
+                    ordinal -= self.interval
+                return self._streak
+        return 0
+
+
+class InMemoryCountCalculator(InMemoryMixin, CountCalculator):
+    def dones_in_duration(self):
+        return self.count_between(self.duration_start, self.duration_end)
+
+    def total_loggable_days(self):
+        return count_loggable_days(
+            self.oldest_done_date, self.today, self.count, self.duration
+        )
+
+
+class InMemorySpecifiedCalculator(InMemoryMixin, SpecifiedCalculator):
+    def done_dates_in_duration(self):
+        return self.dates_between(self.duration_start, self.duration_end)
+
+    def total_loggable_days(self):
+        return specified_loggable_days(
+            self.oldest_done_date, self.today, self.days, self.duration
+        )
+
+
+# "database" is the reference implementation, which queries every duration it checks.
+# "memory" loads the record dates once and checks every duration in memory.
+calculator_backends = {
+    "database": {
+        "interval": IntervalCalculator,
+        "count": CountCalculator,
+        "specified": SpecifiedCalculator,
+    },
+    "memory": {
+        "interval": InMemoryIntervalCalculator,
+        "count": InMemoryCountCalculator,
+        "specified": InMemorySpecifiedCalculator,
+    },
+}
+
+# Optional backends and their dependency, imported the first time they are needed.
+# They add themselves to calculator_backends if their dependency is installed.
+optional_calculator_backends = {"bitmap": ("models.bitmap", "numpy")}
+
+
+def get_calculator_backends():
+    """calculator_backends, with every optional backend that can be used."""
+    for module, _ in optional_calculator_backends.values():
+        importlib.import_module(module)
+    return calculator_backends
@@ -0,0 +1,181 @@
+"""Streak timeline of a habit: its streak at the end of every day/week/month since
+its oldest record, and its longest streak, in one pass over its sorted dates.
+
+Every point is the streak the calculators would return if today was the last day
+of that day/week/month, so the last point is the current streak. Like in the
+calculators, a week/month that is not over yet never breaks the streak, and the
+oldest week/month is allowed to be partly done.
+
+Timelines are cached per habit until the habit's records or method change.
+"""
+
+import datetime
+import threading
+from collections import namedtuple
+
+from cachetools import LRUCache
+
+from models.calendarmath import dates_to_mask, day_number, days_in_range
+from models.calendarmath import first_day_of_duration, week
+
+TimelinePoint = namedtuple("TimelinePoint", ["start", "end", "streak"])
+LongestStreak = namedtuple("LongestStreak", ["length", "start", "end"])
+
+
+def streak_timeline(
+    dates, today, type, duration, interval=None, count=None, specified_mask=None
+):
+    """Returns (timeline, longest streak) of a habit with done dates, sorted oldest
+    first. Dates after today are ignored. The timeline is empty and the longest
+    streak is 0 if there are no dates."""
+    dates = [date for date in dates if date <= today]
+    if not dates:
+        return [], LongestStreak(0, None, None)
+    if type == "interval":
+        return interval_timeline(dates, today, interval)
+    if type == "count":
+        met = lambda start, end, done: len(done) >= count
+        oldest_met = lambda start, end, done: count_oldest_met(
+            dates[0], end, done, count
+        )
+    else:
+        met = lambda start, end, done: specified_met(
+            end, done, specified_mask, duration
+        )
+        oldest_met = lambda start, end, done: specified_oldest_met(
+            dates[0], done, specified_mask, duration
+        )
+    return bucket_timeline(dates, today, duration, met, oldest_met)
+
+
+def interval_timeline(dates, today, interval):
+    """One point per day. A day's streak is the chain of done days, interval days
+    apart, that ends on the last done day at most interval days ago."""
+    oldest = dates[0].toordinal()
+    done = set(date.toordinal() for date in dates)
+    chains = {}
+    last_done = None
+    timeline = []
+    longest = LongestStreak(0, None, None)
+    for day in range(oldest, today.toordinal() + 1):
+        if day in done:
+            chains[day] = chains.get(day - interval, 0) + 1
+            last_done = day
+        streak = 0
+        if day - last_done <= interval:
+            streak = chains[last_done]
+        date = datetime.date.fromordinal(day)
+        timeline.append(TimelinePoint(date, date, streak))
+        if streak > longest.length:
+            start = datetime.date.fromordinal(last_done - (streak - 1) * interval)
+            longest = LongestStreak(streak, start, datetime.date.fromordinal(last_done))
+    return timeline, longest
+
+
+def next_duration_start(start, duration):
+    if duration == week:
+        return start + datetime.timedelta(days=7)
+    return (start + datetime.timedelta(days=31)).replace(day=1)
+
+
+def bucket_timeline(dates, today, duration, met, oldest_met):
+    """One point per week/month. met(start, end, done dates) tells if a week/month
+    reached its goal, and oldest_met does the same for the oldest one, when it is
+    looked back at from a later week/month."""
+    oldest = dates[0]
+    timeline = []
+    longest = LongestStreak(0, None, None)
+    run, run_start, previous_end = 0, None, None
+    i = 0
+    start = first_day_of_duration(oldest, duration)
+    while start <= today:
+        end = next_duration_start(start, duration) - datetime.timedelta(days=1)
+        done = []
+        while i < len(dates) and dates[i] <= end:
+            done.append(dates[i])
+            i += 1
+        is_oldest = start <= oldest
+
+        # the streak if this week/month was the current one, which never breaks it.
+        current_end = min(end, today)
+        current_met = met(start, current_end, done)
+        streak = current_met + (0 if is_oldest else run)
+        timeline.append(TimelinePoint(start, current_end, streak))
+        if streak > longest.length:
+            if not current_met:
+                longest = LongestStreak(streak, run_start, previous_end)
+            elif run and not is_oldest:
+                longest = LongestStreak(streak, run_start, current_end)
+            else:
+                longest = LongestStreak(streak, max(start, oldest), current_end)
+
+        # the streak when it is looked back at from a later week/month.
+        if is_oldest:
+            run = int(oldest_met(start, end, done))
+        else:
+            run = run + 1 if met(start, end, done) else 0
+        if run == 1:
+            run_start = max(start, oldest)
+        previous_end = end
+        start = end + datetime.timedelta(days=1)
+    return timeline, longest
+
+
+def count_oldest_met(oldest, end, done, count):
+    """The oldest week/month reached its goal if it has count dones, or if it has
+    fewer days than count since the oldest record, all of them done."""
+    days = days_in_range(oldest, end)
+    if days >= count:
+        return len(done) >= count
+    return len(done) == days
+
+
+def specified_met(end, done, specified_mask, duration):
+    """All specified days of the week/month are done. A week/month that isn't over
+    yet only counts once its last specified day has come."""
+    if specified_mask.bit_length() > day_number(end, duration):
+        return False
+    return not specified_mask & ~dates_to_mask(done, duration)
+
+
+def specified_oldest_met(oldest, done, specified_mask, duration):
+    """Specified days before the oldest record are ignored, all the others must be
+    done, and there must be at least one of them."""
+    ignored = day_number(oldest, duration) - 1
+    goal = specified_mask >> ignored << ignored
+    return bool(goal) and not goal & ~dates_to_mask(done, duration)
+
+
+##### Cache #####
+
+_cache = LRUCache(maxsize=1024)
+_cache_lock = threading.Lock()
+# changes on every invalidation, so that a timeline computed before it isn't
+# cached after it.
+_generation = 0
+
+
+def get_cached(habit_id, today):
+    """Returns the cached (timeline, longest streak) of a habit, or None, and the
+    generation to pass to set_cached."""
+    with _cache_lock:
+        cached = _cache.get(habit_id)
+        generation = _generation
+    if cached and cached[0] == today:
+        return cached[1], generation
+    return None, generation
+
+
+def set_cached(habit_id, today, result, generation):
+    """Caches result, unless the cache was invalidated since it was computed."""
+    with _cache_lock:
+        if generation == _generation:
+            _cache[habit_id] = (today, result)
+
+
+def invalidate(habit_id):
+    """Forgets a habit's timeline. Call whenever its records or method change."""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache.pop(habit_id, None)
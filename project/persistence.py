@@ -1,42 +1,105 @@
-from ptbcontrib.postgres_persistence import PostgresPersistence
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+import os
 from logging import getLogger
-from typing import Any
 
+import sqlalchemy as sqa
+from sqlalchemy.dialects.mysql import LONGTEXT
 from telegram.ext.dictpersistence import DictPersistence
 
+from dbpool import create_database_engine
 
-class MySQLorPostgresPersistence(PostgresPersistence):
-    def __init__(
-        self,
-        url: str = None,
-        session: scoped_session = None,
-        on_flush: bool = False,
-        **kwargs: Any,
-    ) -> None:
+metadata = sqa.MetaData()
+# one row for each kind of data, holding it as json.
+persistence_table = sqa.Table(
+    "persistence",
+    metadata,
+    sqa.Column("key", sqa.String(50), primary_key=True),
+    sqa.Column("data", sqa.Text().with_variant(LONGTEXT, "mysql"), nullable=False),
+)
+KEYS = ["user_data", "chat_data", "bot_data", "conversations", "callback_data"]
 
-        if url:
-            if not (url.startswith("postgresql://") or url.startswith("mysql://")):
-                raise TypeError(
-                    f"{url} isn't a valid PostgreSQL or MySQL database URL."
-                )
-            engine = create_engine(url, client_encoding="utf8")
-            self._session = scoped_session(sessionmaker(bind=engine, autoflush=False))
 
-        elif session:
+class SQLPersistence(DictPersistence):
+    """Keeps conversations, user, chat and bot data in a table of any database
+    SQLAlchemy supports: SQLite (a file or :memory:), MySQL or PostgreSQL.
 
-            if not isinstance(session, scoped_session):
-                raise TypeError(
-                    "session must needs to be `sqlalchemy.orm.scoped_session` object"
-                )
-            self._session = session
+    Give either the database's url, or an engine to share.
+    With on_flush=True, data is only written when the bot stops, instead of after
+    every change.
 
-        else:
-            raise TypeError("You must need to provide either url or session.")
-        self.logger = getLogger(__name__)
-        super(DictPersistence, self).__init__(**kwargs)
+    When the engine is shared with the bot's session scopes, give
+    defer=base.after_commit, so that data is written after the update's scope
+    commits: on SQLite, the scope holds the write lock until then. A write that is
+    dropped because the scope rolled back is made by the next one, as every write
+    writes all data."""
 
+    def __init__(self, url=None, engine=None, on_flush=False, defer=None, **kwargs):
+        if not (url or engine):
+            raise TypeError("You must provide either url or engine.")
+        self.engine = engine or create_database_engine(url, os.environ)
         self.on_flush = on_flush
-        self.__init_database()
-        self.__load_database()
+        self.defer = defer
+        self.logger = getLogger(__name__)
+
+        metadata.create_all(self.engine)
+        with self.engine.connect() as connection:
+            rows = connection.execute(sqa.select(persistence_table)).all()
+        data = {row.key: row.data for row in rows}
+        self.logger.info("Loaded persistence data.")
+        super().__init__(
+            user_data_json=data.get("user_data", ""),
+            chat_data_json=data.get("chat_data", ""),
+            bot_data_json=data.get("bot_data", ""),
+            conversations_json=data.get("conversations", ""),
+            callback_data_json=data.get("callback_data", ""),
+            **kwargs,
+        )
+
+    def update_database(self):
+        """Writes all data, in one transaction."""
+        rows = [
+            {"key": key, "data": getattr(self, f"{key}_json")}
+            for key in KEYS
+            if getattr(self, key) is not None
+        ]
+        with self.engine.begin() as connection:
+            connection.execute(sqa.delete(persistence_table))
+            connection.execute(sqa.insert(persistence_table), rows)
+
+    def write(self):
+        if self.defer:
+            self.defer(self.update_database)
+        else:
+            self.update_database()
+
+    def update_conversation(self, name, key, new_state):
+        super().update_conversation(name, key, new_state)
+        if not self.on_flush:
+            self.write()
+
+    def update_user_data(self, user_id, data):
+        super().update_user_data(user_id, data)
+        if not self.on_flush:
+            self.write()
+
+    def update_chat_data(self, chat_id, data):
+        super().update_chat_data(chat_id, data)
+        if not self.on_flush:
+            self.write()
+
+    def update_bot_data(self, data):
+        super().update_bot_data(data)
+        if not self.on_flush:
+            self.write()
+
+    def update_callback_data(self, data):
+        super().update_callback_data(data)
+        if not self.on_flush:
+            self.write()
+
+    def flush(self):
+        self.update_database()
+        self.logger.info("Saved persistence data.")
+
+
+# The old name. It only supported MySQL and PostgreSQL.
+MySQLorPostgresPersistence = SQLPersistence
@@ -1,6 +1,18 @@
+import os
+import sys
+
+import sqlalchemy as sqa
+
+from telegram import Update
+from telegram.ext import CommandHandler, TypeHandler
+
 import base
 from controllers.start import Start
 from controllers.errorhandler import error_handler
+from controllers import admin
+from models.models import Habit, Method, Record, StreakState, normalize_name
+from models.models import method_definition
+from models.calendarmath import days_to_mask
 
 
 def recreate_database():
@@ -13,16 +25,225 @@ def recreate_database():
         print(f"     {table}")
 
 
+# indexes the models no longer have, by table.
+# ix_habits_user_name: habits are looked up by normalized_name instead.
+OBSOLETE_INDEXES = {"habits": ["ix_habits_user_name"]}
+
+
+def migrate_database(engine=None):
+    """Brings an existing database up to date with the models, without dropping
+    any data: creates missing tables and missing indexes, and drops obsolete ones.
+    Duplicate records of a habit on the same date are deleted before the unique
+    index on them is created."""
+    engine = engine or base.engine
+    base.Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    fill_normalized_names(engine)
+    fill_specified_masks(engine)
+    merge_duplicate_methods(engine)
+    drop_obsolete_indexes(engine)
+    inspector = sqa.inspect(engine)
+    print("Created indexes:")
+    for table in base.Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.name == "uq_records_habit_date":
+                delete_duplicate_records(engine)
+            index.create(bind=engine)
+            print(f"     {table.name}.{index.name}")
+
+
+def add_missing_columns(engine):
+    """Adds columns of the models that existing tables don't have yet."""
+    inspector = sqa.inspect(engine)
+    print("Added columns:")
+    for table in base.Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            definition = sqa.schema.CreateColumn(column).compile(dialect=engine.dialect)
+            with engine.begin() as connection:
+                connection.execute(
+                    sqa.text(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+                )
+            print(f"     {table.name}.{column.name}")
+
+
+def drop_obsolete_indexes(engine):
+    """Drops the indexes in OBSOLETE_INDEXES that the database still has."""
+    print("Dropped indexes:")
+    for table_name, names in OBSOLETE_INDEXES.items():
+        # reflected, since the models don't have these indexes anymore.
+        table = sqa.Table(table_name, sqa.MetaData(), autoload_with=engine)
+        for index in table.indexes:
+            if index.name in names:
+                index.drop(bind=engine)
+                print(f"     {table_name}.{index.name}")
+
+
+def fill_normalized_names(engine):
+    """Sets normalized_name of habits created before it was added."""
+    with engine.begin() as connection:
+        habits = connection.execute(
+            sqa.select(Habit.id, Habit.name).where(Habit.normalized_name.is_(None))
+        ).all()
+        if habits:
+            # a single executemany, instead of an update per habit.
+            connection.execute(
+                sqa.update(Habit)
+                .where(Habit.id == sqa.bindparam("habit_id"))
+                .values(normalized_name=sqa.bindparam("normalized")),
+                [
+                    {"habit_id": id, "normalized": normalize_name(name or "")}
+                    for id, name in habits
+                ],
+            )
+
+
+def fill_specified_masks(engine):
+    """Sets specified_mask of methods from the comma-separated specified column it
+    replaced, in databases created before. The old column is left in place."""
+    columns = {column["name"] for column in sqa.inspect(engine).get_columns("methods")}
+    if "specified" not in columns:
+        return
+    with engine.begin() as connection:
+        methods = connection.execute(
+            sqa.text(
+                "SELECT id, specified FROM methods "
+                "WHERE specified IS NOT NULL AND specified_mask IS NULL"
+            )
+        ).all()
+        if methods:
+            connection.execute(
+                sqa.update(Method)
+                .where(Method.id == sqa.bindparam("method_id"))
+                .values(specified_mask=sqa.bindparam("mask")),
+                [
+                    {
+                        "method_id": id,
+                        "mask": days_to_mask(
+                            [int(day) for day in specified.split(",") if day.strip()]
+                        ),
+                    }
+                    for id, specified in methods
+                ],
+            )
+
+
+def merge_duplicate_methods(engine):
+    """Sets definition of methods created before it was added, and makes the
+    habits of identical methods share the oldest of them, so that the unique
+    index on definitions can be created."""
+    with engine.begin() as connection:
+        methods = connection.execute(
+            sqa.select(
+                Method.id,
+                Method.type,
+                Method.duration,
+                Method.interval,
+                Method.count,
+                Method.specified_mask,
+            )
+            .where(Method.definition.is_(None))
+            .order_by(Method.id)
+        ).all()
+        if methods:
+            connection.execute(
+                sqa.update(Method)
+                .where(Method.id == sqa.bindparam("method_id"))
+                .values(definition=sqa.bindparam("method_definition")),
+                [
+                    {"method_id": id, "method_definition": method_definition(*values)}
+                    for id, *values in methods
+                ],
+            )
+        kept = (
+            sqa.select(Method.definition, sqa.func.min(Method.id).label("id"))
+            .group_by(Method.definition)
+            .subquery("kept")
+        )
+        duplicates = connection.execute(
+            sqa.select(Method.id, kept.c.id)
+            .join(kept, Method.definition == kept.c.definition)
+            .where(Method.id != kept.c.id)
+        ).all()
+        if duplicates:
+            connection.execute(
+                sqa.update(Habit)
+                .where(Habit.method == sqa.bindparam("duplicate"))
+                .values(method=sqa.bindparam("kept")),
+                [{"duplicate": id, "kept": kept_id} for id, kept_id in duplicates],
+            )
+            connection.execute(
+                sqa.delete(Method).where(Method.id == sqa.bindparam("duplicate")),
+                [{"duplicate": id} for id, _ in duplicates],
+            )
+
+
+def delete_duplicate_records(engine):
+    """Keeps the oldest record of every habit and date, and marks streaks stale if
+    any record was deleted."""
+    keep = (
+        sqa.select(sqa.func.min(Record.id).label("id"))
+        .group_by(Record.habit, Record.date)
+        .subquery("keep")
+    )
+    with engine.begin() as connection:
+        deleted = connection.execute(
+            sqa.delete(Record).where(Record.id.not_in(sqa.select(keep.c.id)))
+        ).rowcount
+        if deleted:
+            connection.execute(sqa.update(StreakState).values(stale=True))
+    print(f"Deleted {deleted} duplicate records.")
+
+
+def open_update_scope(update, context):
+    """Runs before the handlers of every update. see base.session_scope()."""
+    # a scope is left open only if a handler stopped the update's other handlers.
+    base.end_scope()
+    base.begin_scope()
+
+
+def close_update_scope(update, context):
+    """Runs after the handlers of every update, and commits what they did."""
+    scope = base.end_scope()
+    if scope:
+        base.logger.debug(f"update used {scope.statements} SQL statements")
+
+
 def main():
     start_menu = Start()
 
+    base.dispatcher.add_handler(TypeHandler(Update, open_update_scope), group=-1)
+    # before the conversations, which would take the command while one is open.
+    base.dispatcher.add_handler(CommandHandler("poolstats", admin.pool_stats))
     base.dispatcher.add_handler(start_menu.handler)
+    base.dispatcher.add_handler(TypeHandler(Update, close_update_scope), group=1)
     base.dispatcher.add_error_handler(error_handler)
 
+    # db_pool_log_interval: seconds between logs of the pool's statistics.
+    if os.environ.get("db_pool_log_interval"):
+        base.updater.job_queue.run_repeating(
+            admin.log_pool_stats, interval=int(os.environ["db_pool_log_interval"])
+        )
+
+    # method_gc_interval: seconds between deletions of methods no habit uses.
+    base.updater.job_queue.run_repeating(
+        admin.collect_unused_methods,
+        interval=int(os.environ.get("method_gc_interval", 3600)),
+    )
+
     # recreate_database()
     base.updater.start_polling()
     base.updater.idle()
 
 
 if __name__ == "__main__":
-    main()
+    # python run.py migrate: updates the database schema instead of starting the bot.
+    if sys.argv[1:] == ["migrate"]:
+        migrate_database()
+    else:
+        main()
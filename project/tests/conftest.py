@@ -0,0 +1,20 @@
+"""Runs the tests on a new SQLite database in a temporary directory, unless db_url
+is set. Nothing else is needed to run them: python -m pytest tests"""
+
+import os
+import shutil
+import tempfile
+
+directory = tempfile.mkdtemp(prefix="juno-tests-")
+os.environ.setdefault("db_url", f"sqlite:///{os.path.join(directory, 'juno.db')}")
+os.environ.setdefault("token", "123456:test-token")
+
+import base
+from models import models
+
+base.Base.metadata.create_all(base.engine)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    base.engine.dispose()
+    shutil.rmtree(directory, ignore_errors=True)
@@ -20,7 +20,7 @@ class TestSpecified(TestCase):
     def test_convert_specified(self):
         sample_ls = [2, 3, 4]
         result = self.method.convert_specified(sample_ls)
-        self.assertEqual(type(result), str)
+        self.assertEqual(result, 0b1110)
 
     def test_specified_days_property(self):
         result = self.method.specified_days
@@ -28,6 +28,19 @@ class TestSpecified(TestCase):
         self.assertEqual(type(result), list)
         self.assertEqual(type(result[0]), int)
 
+    def test_specified_mask_is_saved(self):
+        with Session() as s:
+            method = s.query(Method).filter_by(id=self.method_id).one()
+            self.assertEqual(method.specified_mask, 0b10101)
+            self.assertEqual(method.specified, method.specified_mask)
+
+    def test_month_days(self):
+        method = Method(type="specified", duration="month", specified=[31, 1, 15])
+        self.assertEqual(method.specified_mask, 1 | 1 << 14 | 1 << 30)
+        self.assertEqual(method.specified_days, [1, 15, 31])
+        method = Method(type="specified", duration="month", specified_mask=1 << 30)
+        self.assertEqual(method.specified_days, [31])
+
     def tearDown(self) -> None:
 
         with Session() as s:
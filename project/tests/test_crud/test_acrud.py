@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+
+from base import Session, session_scope
+from controllers import acrud, cache, crud
+from dbpool import async_url
+from models.models import Habit, Method, Record, User
+from unittest import TestCase
+import unittest
+
+
+class TestAsyncUrl(TestCase):
+    def test_drivers(self):
+        urls = {
+            "sqlite:////tmp/juno.db": "sqlite+aiosqlite",
+            "mysql+pymysql://juno:pw@localhost/juno": "mysql+asyncmy",
+            "postgresql://juno:pw@localhost/juno": "postgresql+asyncpg",
+        }
+        for url, drivername in urls.items():
+            self.assertEqual(async_url(url).drivername, drivername)
+        self.assertEqual(async_url("mysql://juno:pw@localhost/juno").password, "pw")
+
+    def test_sqlite_memory(self):
+        self.assertIsNone(async_url("sqlite://"))
+
+
+class TestAcrud(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        self.date = datetime.date(2022, 5, 10)
+        crud.create_user(self.user_id, 0)
+        self.habits = []
+        for name in ["a", "b"]:
+            method = crud.create_method(type="interval", duration="day", interval=1)
+            self.habits.append(crud.create_habit(name, self.user_id, method))
+        crud.create_record(self.user_id, self.habits[0].id, self.date)
+
+    def test_gather(self):
+        user, habit, method, record, missing = acrud.run(
+            acrud.gather(
+                acrud.get_user(self.user_id),
+                acrud.get_habit(self.habits[0].id, self.user_id),
+                acrud.get_method(self.habits[0].method),
+                acrud.get_record(self.user_id, self.habits[0].id, self.date),
+                acrud.get_record(self.user_id, self.habits[1].id, self.date),
+            )
+        )
+        self.assertEqual(user.id, self.user_id)
+        self.assertEqual(habit.name, "a")
+        self.assertEqual(method.type.code, "interval")
+        self.assertEqual(record.date, self.date)
+        self.assertIsNone(missing)
+
+    def test_runs_at_the_same_time(self):
+        async def wait():
+            await asyncio.sleep(0.2)
+
+        start = datetime.datetime.now()
+        acrud.run(acrud.gather(*[wait() for _ in range(5)]))
+        self.assertLess(datetime.datetime.now() - start, datetime.timedelta(seconds=1))
+
+    def test_shares_crud_cache(self):
+        user = crud.get_user(self.user_id)
+        self.assertIs(acrud.run(acrud.get_user(self.user_id)), user)
+        self.assertIsNone(acrud.run(acrud.get_habit(self.habits[0].id, 2)))
+
+    def test_user_habits(self):
+        with Session() as s:
+            user = s.query(User).filter_by(id=self.user_id).one()
+        habits = acrud.run(acrud.get_user_habits(self.user_id))
+        self.assertEqual(habits, user.get_habits())
+        self.assertEqual([habit.name for habit in habits], ["b", "a"])
+
+    def test_after_uncommitted_writes(self):
+        with session_scope():
+            acrud.run(acrud.get_user(self.user_id))
+            habit = crud.create_habit("c", self.user_id, self.habits[0].method)
+            habits, habit_c = acrud.run(
+                acrud.gather(
+                    acrud.get_user_habits(self.user_id),
+                    acrud.get_habit(habit.id, self.user_id),
+                )
+            )
+            self.assertEqual([habit.name for habit in habits], ["c", "b", "a"])
+            self.assertEqual(habit_c.name, "c")
+            self.assertEqual(cache.habits.stats()["size"], 0)
+        self.assertEqual(acrud.run(acrud.get_habit(habit.id, self.user_id)).name, "c")
+
+    def tearDown(self) -> None:
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        cache.clear()
+
+
+@unittest.skipIf(
+    acrud.get_engine() is None,
+    "the async driver of the database (see dbpool.ASYNC_DRIVERS) isn't installed",
+)
+class TestAsyncEngine(TestAcrud):
+    """The same tests, on the asyncio engine."""
+
+    def test_uses_the_engine(self):
+        self.assertIsNotNone(acrud.get_engine())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import asyncio
+import datetime
+import threading
+
+from base import Session, session_scope
+from controllers import cache, crud
+from models.models import Habit, Method, User
+from unittest import TestCase
+import unittest
+
+
+class TestReadThroughCache(TestCase):
+    def test_hits_and_misses(self):
+        lookups = []
+        test_cache = cache.ReadThroughCache("test", maxsize=10, ttl=60)
+        load = lambda: lookups.append(1) or "value"
+        self.assertEqual(test_cache.get(1, load), "value")
+        self.assertEqual(test_cache.get(1, load), "value")
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(test_cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_caches_missing_values(self):
+        test_cache = cache.ReadThroughCache("test", maxsize=10, ttl=60)
+        test_cache.get(1, lambda: None)
+        self.assertIsNone(test_cache.get(1, lambda: "value"))
+        test_cache.invalidate(1)
+        self.assertEqual(test_cache.get(1, lambda: "value"), "value")
+
+    def test_get_async(self):
+        test_cache = cache.ReadThroughCache("test", maxsize=10, ttl=60)
+
+        async def load():
+            return "value"
+
+        self.assertEqual(asyncio.run(test_cache.get_async(1, load)), "value")
+        self.assertEqual(test_cache.get(1, lambda: "other"), "value")
+        self.assertEqual(test_cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_invalidated_while_loading(self):
+        test_cache = cache.ReadThroughCache("test", maxsize=10, ttl=60)
+
+        def load():
+            test_cache.invalidate(1)  # a write committed during the lookup
+            return "old value"
+
+        self.assertEqual(test_cache.get(1, load), "old value")
+        self.assertEqual(test_cache.get(1, lambda: "new value"), "new value")
+
+
+class TestCrudCache(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        cache.clear()
+        crud.create_user(self.user_id, 0)
+        method = crud.create_method(type="interval", duration="day", interval=1)
+        self.habit = crud.create_habit("cached_habit", self.user_id, method)
+
+    def test_get_user_is_cached(self):
+        misses = cache.users.misses
+        user = crud.get_user(self.user_id)
+        self.assertIs(crud.get_user(self.user_id), user)
+        self.assertEqual(cache.users.misses, misses + 1)
+
+    def test_create_user_invalidates(self):
+        self.assertIsNone(crud.get_user(self.user_id + 1))
+        crud.create_user(self.user_id + 1, 0)
+        self.assertIsNotNone(crud.get_user(self.user_id + 1))
+        crud.delete_user(self.user_id + 1)
+        self.assertIsNone(crud.get_user(self.user_id + 1))
+
+    def test_get_habit_checks_user(self):
+        self.assertIsNotNone(crud.get_habit(self.habit.id, self.user_id))
+        self.assertIsNone(crud.get_habit(self.habit.id, self.user_id + 1))
+
+    def test_edit_habit_invalidates(self):
+        crud.get_habit(self.habit.id, self.user_id)
+        crud.edit_habit(self.habit.id, new_name="renamed")
+        self.assertEqual(crud.get_habit(self.habit.id, self.user_id).name, "renamed")
+
+        old_method = crud.get_method(self.habit.method)
+        new_method = crud.create_method(type="interval", duration="day", interval=2)
+        crud.edit_habit(self.habit.id, new_method=new_method)
+        habit = crud.get_habit(self.habit.id, self.user_id)
+        self.assertEqual(crud.get_method(habit.method).interval, 2)
+        self.assertIsNone(crud.get_method(old_method.id))
+
+    def test_delete_habit_invalidates(self):
+        habit = crud.get_habit(self.habit.id, self.user_id)
+        self.assertIsNotNone(crud.get_method(habit.method))
+        crud.delete_habit(habit)
+        self.assertIsNone(crud.get_habit(self.habit.id, self.user_id))
+        self.assertIsNone(crud.get_method(habit.method))
+
+    def test_create_habit_invalidates(self):
+        # SQLite reuses the id of the last deleted row.
+        crud.delete_habit(crud.get_habit(self.habit.id, self.user_id))
+        self.assertIsNone(crud.get_habit(self.habit.id, self.user_id))
+        method = crud.create_method(type="interval", duration="day", interval=1)
+        habit = crud.create_habit("new_habit", self.user_id, method)
+        self.assertEqual(habit.id, self.habit.id)
+        self.assertEqual(crud.get_habit(habit.id, self.user_id).name, "new_habit")
+
+    def test_not_cached_until_commit(self):
+        with self.assertRaises(ValueError):
+            with session_scope():
+                crud.create_user(self.user_id + 1, 0)
+                self.assertIsNotNone(crud.get_user(self.user_id + 1))
+                self.assertEqual(cache.users.stats()["size"], 0)
+                raise ValueError
+        self.assertIsNone(crud.get_user(self.user_id + 1))
+
+    def test_invalidated_on_commit(self):
+        with session_scope():
+            crud.edit_habit(self.habit.id, new_name="renamed")
+            # another update caches the habit before the scope commits.
+            reader = threading.Thread(
+                target=crud.get_habit, args=(self.habit.id, self.user_id)
+            )
+            reader.start()
+            reader.join()
+            self.assertEqual(cache.habits.stats()["size"], 1)
+        self.assertEqual(crud.get_habit(self.habit.id, self.user_id).name, "renamed")
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        cache.clear()
+
+
+class TestLookupStatements(TestCase):
+    def test_compiled_once(self):
+        """Lookups with different parameters have the same cache key, so they
+        share their compiled statement."""
+        lookups = [
+            (crud.user_by_id, (1,), (2,)),
+            (crud.habit_by_id, (1,), (2,)),
+            (crud.method_by_id, (1,), (2,)),
+            (
+                crud.record_on_date,
+                (1, 1, datetime.date(2022, 1, 1)),
+                (2, 3, datetime.date(2022, 1, 2)),
+            ),
+        ]
+        for lookup, args1, args2 in lookups:
+            key1 = lookup(*args1)._generate_cache_key()
+            key2 = lookup(*args2)._generate_cache_key()
+            self.assertEqual(key1.key, key2.key)
+            self.assertNotEqual(
+                [p.effective_value for p in key1.bindparams],
+                [p.effective_value for p in key2.bindparams],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
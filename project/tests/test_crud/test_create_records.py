@@ -0,0 +1,167 @@
+import datetime
+import threading
+
+from sqlalchemy import event
+
+import base
+from base import Session
+from controllers import crud
+from controllers.backfill import parse_dates, MAX_DAYS
+from models.models import Habit, Record, Method, StreakState, User
+from unittest import TestCase
+import unittest
+
+
+class TestCreateRecords(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            method = Method(type="interval", duration="day", interval=1)
+            s.add_all([user, method])
+            s.commit()
+            self.habit = Habit("backfill_habit", user.id, method.id)
+            s.add(self.habit)
+            s.commit()
+        self.today = self.habit.today_in_timezone()
+        self.statements = []
+        event.listen(base.engine, "before_cursor_execute", self.count_statement)
+
+    def count_statement(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def days_ago(self, *days):
+        return [self.today - datetime.timedelta(days=day) for day in days]
+
+    def saved_dates(self):
+        with Session() as s:
+            records = s.query(Record.date).filter_by(habit=self.habit.id)
+            return sorted(date for (date,) in records)
+
+    def test_inserts_in_one_statement(self):
+        dates = self.days_ago(*range(200))
+        logged = crud.create_records(self.user_id, self.habit.id, dates)
+        self.assertEqual(logged, sorted(dates))
+        self.assertEqual(self.saved_dates(), sorted(dates))
+        inserts = [s for s in self.statements if s.startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+
+    def test_large_backfills_are_split(self):
+        dates = self.days_ago(*range(crud.RECORDS_PER_INSERT + 1))
+        crud.create_records(self.user_id, self.habit.id, dates)
+        inserts = [s for s in self.statements if s.startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(len(self.saved_dates()), crud.RECORDS_PER_INSERT + 1)
+
+    def test_skips_existing_dates(self):
+        crud.create_record(self.user_id, self.habit.id, self.days_ago(1)[0])
+        logged = crud.create_records(
+            self.user_id, self.habit.id, self.days_ago(0, 1, 2)
+        )
+        self.assertEqual(logged, self.days_ago(2, 0))
+        self.assertEqual(self.saved_dates(), self.days_ago(2, 1, 0))
+        self.assertEqual(crud.create_records(self.user_id, self.habit.id, []), [])
+
+    def test_create_record_in_one_statement(self):
+        record = crud.create_record(self.user_id, self.habit.id, self.today)
+        # the insert, and the streak state.
+        self.assertEqual(len(self.statements), 2)
+        self.assertTrue(self.statements[0].startswith("INSERT"))
+        self.assertIsNone(crud.create_record(self.user_id, self.habit.id, self.today))
+        self.assertEqual(self.saved_dates(), [self.today])
+
+        crud.delete_record(record)
+        self.assertEqual(self.saved_dates(), [])
+
+    def test_concurrent_create_record(self):
+        results = []
+
+        def log():
+            results.append(crud.create_record(self.user_id, self.habit.id, self.today))
+
+        threads = [threading.Thread(target=log) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len([record for record in results if record]), 1)
+        self.assertEqual(self.saved_dates(), [self.today])
+
+    def test_dates_logged_since_checked(self):
+        dates = self.days_ago(0, 1, 2)
+        raced = []
+
+        def log_first(conn, cursor, statement, *args):
+            # another update logs a date after create_records checked it.
+            if statement.startswith("INSERT INTO records") and not raced:
+                raced.append(None)
+                raced[0] = crud.create_record(self.user_id, self.habit.id, dates[0])
+
+        event.listen(base.engine, "before_cursor_execute", log_first)
+        try:
+            logged = crud.create_records(self.user_id, self.habit.id, dates)
+        finally:
+            event.remove(base.engine, "before_cursor_execute", log_first)
+        self.assertIsNotNone(raced[0])
+        self.assertEqual(logged, sorted(dates[1:]))
+        self.assertEqual(self.saved_dates(), sorted(dates))
+
+    def test_streak_is_recalculated(self):
+        crud.create_records(self.user_id, self.habit.id, self.days_ago(0, 1))
+        self.assertEqual(self.habit.streak, 2)
+        crud.create_records(self.user_id, self.habit.id, self.days_ago(*range(2, 10)))
+        self.assertEqual(self.habit.streak, 10)
+        self.assertEqual(self.habit.longest_streak.length, 10)
+
+    def tearDown(self) -> None:
+        event.remove(base.engine, "before_cursor_execute", self.count_statement)
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(StreakState).filter_by(habit=self.habit.id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+
+
+class TestParseDates(TestCase):
+    today = datetime.date(2022, 5, 10)
+
+    def test_dates_and_ranges(self):
+        dates = parse_dates(
+            "2022-01-30 to 2022-02-02,\n2022-3-5, 2022-05-01..2022-05-01", self.today
+        )
+        expected = [
+            datetime.date(2022, 1, 30),
+            datetime.date(2022, 1, 31),
+            datetime.date(2022, 2, 1),
+            datetime.date(2022, 2, 2),
+            datetime.date(2022, 3, 5),
+            datetime.date(2022, 5, 1),
+        ]
+        self.assertEqual(sorted(dates), expected)
+
+    def test_reversed_range(self):
+        dates = parse_dates("2022-05-10 - 2022-05-08", self.today)
+        self.assertEqual(len(dates), 3)
+
+    def test_invalid(self):
+        for text in [
+            "",
+            "yesterday",
+            "2022-02-30",
+            "2022-05-11",
+            "2000-01-01 to 2022-01-01",
+        ]:
+            with self.assertRaises(ValueError, msg=text):
+                parse_dates(text, self.today)
+
+    def test_max_days(self):
+        start = self.today - datetime.timedelta(days=MAX_DAYS - 1)
+        self.assertEqual(
+            len(parse_dates(f"{start} to {self.today}", self.today)), MAX_DAYS
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
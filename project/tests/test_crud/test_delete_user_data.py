@@ -0,0 +1,164 @@
+import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import event
+
+import base
+from base import Session
+from controllers import cache, crud
+from controllers.deletemydata import DeleteMyData
+from models.models import Habit, Record, Method, StreakState, User
+from unittest import TestCase
+import unittest
+
+
+class TestDeleteUserData(TestCase):
+    user_ids = [1, 2]
+
+    def setUp(self) -> None:
+        self.today = datetime.date(2022, 5, 10)
+        for user_id in self.user_ids:
+            crud.create_user(user_id, 0)
+            for name in ["a", "b", "c"]:
+                method = crud.create_method(type="interval", duration="day", interval=1)
+                habit = crud.create_habit(name, user_id, method)
+                dates = [self.today - datetime.timedelta(days=i) for i in range(20)]
+                crud.create_records(user_id, habit.id, dates)
+                habit.streak  # creates its streak state
+        self.commits = 0
+        event.listen(base.engine, "commit", self.count_commit)
+
+    def count_commit(self, *args):
+        self.commits += 1
+
+    def counts(self, user_id):
+        with Session() as s:
+            habits = s.query(Habit).filter_by(user=user_id)
+            return {
+                "users": s.query(User).filter_by(id=user_id).count(),
+                "habits": habits.count(),
+                "records": s.query(Record).filter_by(user=user_id).count(),
+                "methods": s.query(Method)
+                .filter(Method.id.in_(habits.with_entities(Habit.method)))
+                .count(),
+                "streaks": s.query(StreakState)
+                .filter(StreakState.habit.in_(habits.with_entities(Habit.id)))
+                .count(),
+            }
+
+    def test_deletes_everything_in_one_transaction(self):
+        other_user = self.counts(2)
+        method = crud.get_method(crud.get_user(1).get_habits()[0].method)
+        self.assertEqual(crud.count_user_records(1), 60)
+
+        crud.delete_user_data(1)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(set(self.counts(1).values()), {0})
+        with Session() as s:
+            self.assertEqual(s.query(StreakState).count(), 3)
+            # the habits of both users share one method.
+            self.assertEqual(s.query(Method).count(), 1)
+        self.assertEqual(self.counts(2), other_user)
+        self.assertIsNone(crud.get_user(1))
+        self.assertIsNotNone(crud.get_method(method.id))
+
+        crud.delete_user_data(2)
+        self.assertIsNone(crud.get_method(method.id))
+
+    def test_reports_progress(self):
+        progress = []
+        crud.delete_user_data(
+            1, progress=lambda *args: progress.append(args), batch_size=25
+        )
+        self.assertEqual(progress, [(25, 60), (50, 60), (60, 60)])
+        self.assertEqual(self.counts(1)["records"], 0)
+
+    def test_rolls_back_on_error(self):
+        before = self.counts(1)
+
+        def fail(deleted, total):
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            crud.delete_user_data(1, progress=fail, batch_size=10)
+        self.assertEqual(self.counts(1), before)
+
+    def run_deletion_job(self, attempt, failing_edits=False):
+        """Runs DeleteMyData's job for user 1. Returns the texts it showed and the
+        jobs it scheduled."""
+        texts, jobs = [], []
+
+        def edit_message_text(text, **kwargs):
+            texts.append(text)
+            if failing_edits:
+                raise RuntimeError("telegram is down")
+
+        context = SimpleNamespace(
+            job=SimpleNamespace(
+                context={
+                    "user_id": 1,
+                    "chat_id": 1,
+                    "message_id": 1,
+                    "attempt": attempt,
+                },
+                name="deletion",
+            ),
+            bot=SimpleNamespace(edit_message_text=edit_message_text),
+            job_queue=SimpleNamespace(
+                run_once=lambda *args, **kwargs: jobs.append(kwargs)
+            ),
+        )
+        DeleteMyData().deletion_job(context)
+        return texts, jobs
+
+    def fail_user_deletion(self, conn, cursor, statement, *args):
+        if statement.startswith("DELETE FROM users"):
+            raise RuntimeError("database is down")
+
+    def test_deletion_job(self):
+        menu = DeleteMyData()
+        texts, jobs = self.run_deletion_job(attempt=1)
+        self.assertEqual(texts, [menu.progress_text(100), menu.goodbye_text])
+        self.assertEqual(jobs, [])
+        self.assertEqual(self.counts(1)["users"], 0)
+
+    def test_deletion_job_ignores_failing_edits(self):
+        menu = DeleteMyData()
+        texts, jobs = self.run_deletion_job(attempt=1, failing_edits=True)
+        self.assertEqual(texts, [menu.progress_text(100), menu.goodbye_text])
+        self.assertEqual(jobs, [])
+        self.assertEqual(set(self.counts(1).values()), {0})
+
+    def test_deletion_job_retries(self):
+        menu = DeleteMyData()
+        before = self.counts(1)
+        event.listen(base.engine, "before_cursor_execute", self.fail_user_deletion)
+        try:
+            texts, jobs = self.run_deletion_job(attempt=1)
+            self.assertEqual(texts[-1], menu.retry_text())
+            self.assertEqual([job["context"]["attempt"] for job in jobs], [2])
+            self.assertEqual(self.counts(1), before)
+
+            texts, jobs = self.run_deletion_job(attempt=menu.deletion_attempts)
+            self.assertEqual(texts[-1], menu.failed_text())
+            self.assertEqual(jobs, [])
+            self.assertEqual(self.counts(1), before)
+        finally:
+            event.remove(base.engine, "before_cursor_execute", self.fail_user_deletion)
+
+    def tearDown(self) -> None:
+        event.remove(base.engine, "commit", self.count_commit)
+        with Session() as s:
+            s.query(Record).delete()
+            s.query(StreakState).delete()
+            s.query(Habit).delete()
+            s.query(Method).delete()
+            s.query(User).filter(User.id.in_(self.user_ids)).delete(
+                synchronize_session=False
+            )
+            s.commit()
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
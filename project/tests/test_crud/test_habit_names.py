@@ -0,0 +1,60 @@
+from base import Session
+from controllers import cache, crud
+from models.models import Habit, Method, User
+from unittest import TestCase
+import unittest
+
+
+class TestHabitNames(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        self.other_user_id = 2
+        with Session(expire_on_commit=False) as s:
+            self.user = User(self.user_id, 0)
+            s.add_all([self.user, User(self.other_user_id, 0)])
+            s.commit()
+        self.habit = crud.create_habit("Read Books", self.user_id, self.new_method())
+
+    def new_method(self):
+        return crud.create_method(type="interval", duration="day", interval=1)
+
+    def test_duplicate_ignores_case(self):
+        self.assertTrue(self.user.habit_name_is_duplicate("read books"))
+        self.assertTrue(self.user.habit_name_is_duplicate(" READ BOOKS "))
+        self.assertFalse(self.user.habit_name_is_duplicate("read"))
+
+    def test_duplicate_is_per_user(self):
+        other_user = crud.get_user(self.other_user_id)
+        self.assertFalse(other_user.habit_name_is_duplicate("Read Books"))
+        habit = crud.create_habit("read books", self.other_user_id, self.new_method())
+        self.assertIsNotNone(habit)
+
+    def test_create_habit_rejects_duplicate(self):
+        self.assertIsNone(crud.create_habit("READ books", self.user_id, 1))
+
+    def test_get_habit_by_name(self):
+        habit = crud.get_habit_by_name("read BOOKS", self.user_id)
+        self.assertEqual(habit.id, self.habit.id)
+        self.assertIsNone(crud.get_habit_by_name("read books", self.other_user_id))
+
+    def test_rename_updates_normalized_name(self):
+        crud.edit_habit(self.habit.id, new_name="Write Poems")
+        self.assertFalse(self.user.habit_name_is_duplicate("read books"))
+        self.assertTrue(self.user.habit_name_is_duplicate("write poems"))
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Habit).filter(
+                Habit.user.in_([self.user_id, self.other_user_id])
+            ).delete(synchronize_session=False)
+            s.query(Method).delete()
+            s.query(User).filter(
+                User.id.in_([self.user_id, self.other_user_id])
+            ).delete(synchronize_session=False)
+            s.commit()
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
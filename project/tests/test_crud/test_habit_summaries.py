@@ -0,0 +1,137 @@
+import datetime
+
+from sqlalchemy import event
+
+import base
+from base import Session
+from controllers import cache, crud
+from models import timeline
+from models.models import Habit, Record, Method, StreakState, User
+from unittest import TestCase
+import unittest
+
+
+class TestHabitSummaries(TestCase):
+    methods = [
+        {"type": "interval", "duration": "day", "interval": 1},
+        {"type": "count", "duration": "week", "count": 3},
+        {"type": "specified", "duration": "month", "specified": [1, 10, 20]},
+        {"type": "interval", "duration": "day", "interval": 2},
+    ]
+
+    def setUp(self) -> None:
+        self.user_id = 1
+        self.method_ids = []
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            s.add(user)
+            s.commit()
+            today = user.date_joined
+            for i, kwargs in enumerate(self.methods):
+                method = Method(**kwargs)
+                s.add(method)
+                s.commit()
+                self.method_ids.append(method.id)
+                habit = Habit(f"habit {i}", user.id, method.id)
+                s.add(habit)
+                s.commit()
+                # the last habit has no records.
+                if i == len(self.methods) - 1:
+                    continue
+                dates = [
+                    today - datetime.timedelta(days=days)
+                    for days in range(0, 90)
+                    if days % (i + 2)
+                ]
+                s.add_all(Record(user.id, habit.id, date) for date in dates)
+                s.commit()
+
+    def test_same_as_habit_properties(self):
+        summaries = crud.get_habit_summaries(self.user_id)
+        habits = crud.get_user(self.user_id).get_habits()
+        self.assertEqual(
+            [summary["id"] for summary in summaries], [h.id for h in habits]
+        )
+
+        for summary in summaries:
+            habit = crud.get_habit(summary["id"], self.user_id)
+            self.assertEqual(summary["name"], habit.name)
+            self.assertEqual(summary["streak"], habit.streak)
+            self.assertEqual(summary["done_this_week"], habit.done_this_week)
+            self.assertEqual(summary["done_this_month"], habit.done_this_month)
+            self.assertEqual(summary["total_done_days"], habit.total_done_days)
+
+    def test_snapshot_same_as_habit_properties(self):
+        for habit in crud.get_user(self.user_id).get_habits():
+            habit = crud.get_habit(habit.id, self.user_id)
+            snapshot = habit.snapshot()
+            dates = [record.date for record in habit.records]
+            self.assertEqual(snapshot.name, habit.name)
+            self.assertEqual(snapshot.streak, habit.streak)
+            self.assertEqual(snapshot.longest_streak, habit.longest_streak)
+            self.assertEqual(snapshot.done_this_week, habit.done_this_week)
+            self.assertEqual(snapshot.done_this_month, habit.done_this_month)
+            self.assertEqual(snapshot.total_done_days, habit.total_done_days)
+            self.assertEqual(snapshot.has_logs, habit.has_logs)
+            self.assertEqual(snapshot.first_done, min(dates, default=None))
+            self.assertEqual(snapshot.last_done, max(dates, default=None))
+
+    def test_snapshot_queries(self):
+        habit = crud.get_habit(
+            crud.get_user(self.user_id).get_habits()[-1].id, self.user_id
+        )
+        habit.snapshot()  # calculates the streak state and timeline
+        statements = []
+        count = lambda *args: statements.append(args[2])
+        event.listen(base.engine, "before_cursor_execute", count)
+        try:
+            habit.snapshot()
+        finally:
+            event.remove(base.engine, "before_cursor_execute", count)
+        # method with timezone, the aggregate of records, and the streak state.
+        self.assertEqual(len(statements), 3)
+
+    def test_snapshot_queries_cold(self):
+        for summary in crud.get_habit_summaries(self.user_id):
+            habit = crud.get_habit(summary["id"], self.user_id)
+            with Session() as s:
+                s.query(StreakState).filter_by(habit=habit.id).update({"stale": True})
+                s.commit()
+            timeline.invalidate(habit.id)
+            statements = []
+            count = lambda *args: statements.append(args[2])
+            event.listen(base.engine, "before_cursor_execute", count)
+            try:
+                habit.snapshot()
+            finally:
+                event.remove(base.engine, "before_cursor_execute", count)
+            # the user and method are read once, with the first query.
+            reads_method = ["methods" in statement for statement in statements]
+            self.assertEqual(reads_method, [True] + [False] * (len(statements) - 1))
+            # and the recalculation loads the records and saves the streak state,
+            # with the records of this week/month for count methods.
+            method = crud.get_method(habit.method)
+            self.assertEqual(len(statements), 7 if method.type == "count" else 6)
+
+    def test_user_without_habits(self):
+        self.assertEqual(crud.get_habit_summaries(self.user_id + 1), [])
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            habit_ids = s.query(Habit.id).filter_by(user=self.user_id)
+            s.query(StreakState).filter(StreakState.habit.in_(habit_ids)).delete(
+                synchronize_session=False
+            )
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).filter(Method.id.in_(self.method_ids)).delete(
+                synchronize_session=False
+            )
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import datetime
+
+from sqlalchemy import event
+
+import base
+from base import Session, session_scope, session_factory
+from controllers import cache, crud
+from models.models import Habit, Method, Record, StreakState, User
+from run import open_update_scope, close_update_scope
+from unittest import TestCase
+import unittest
+
+
+class TestSessionScope(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            method = Method(type="interval", duration="day", interval=1)
+            s.add_all([user, method])
+            s.commit()
+            self.habit = Habit("scope_habit", user.id, method.id)
+            s.add(self.habit)
+            s.commit()
+        self.today = self.habit.today_in_timezone()
+        self.checkouts = 0
+        event.listen(base.engine, "checkout", self.count_checkout)
+
+    def count_checkout(self, *args):
+        self.checkouts += 1
+
+    def committed_records(self):
+        """Counts records with a session outside of the scope."""
+        with session_factory() as s:
+            return s.query(Record).filter_by(habit=self.habit.id).count()
+
+    def test_one_session_in_scope(self):
+        with session_scope() as scope:
+            with Session() as s1, Session(expire_on_commit=False) as s2:
+                self.assertIs(s1._session, scope.session)
+                self.assertIs(s2._session, scope.session)
+            with session_scope() as inner:
+                self.assertIs(inner, scope)
+        self.assertIsNone(base.current_scope())
+
+    def test_commits_once_at_the_end(self):
+        with session_scope():
+            crud.create_record(self.user_id, self.habit.id, self.today)
+            self.assertEqual(crud.get_habit(self.habit.id, self.user_id).streak, 1)
+            self.assertEqual(self.committed_records(), 0)
+        self.assertEqual(self.committed_records(), 1)
+
+    def test_rolls_back_on_error(self):
+        with self.assertRaises(ValueError):
+            with session_scope():
+                crud.create_record(self.user_id, self.habit.id, self.today)
+                raise ValueError
+        self.assertEqual(self.committed_records(), 0)
+
+    def test_stats_in_one_connection(self):
+        for days in range(3):
+            date = self.today - datetime.timedelta(days=days)
+            crud.create_record(self.user_id, self.habit.id, date)
+        self.checkouts = 0
+        with session_scope() as scope:
+            habit = crud.get_habit(self.habit.id, self.user_id)
+            self.assertTrue(habit.has_logs)
+            self.assertEqual(habit.streak, 3)
+            self.assertEqual(habit.longest_streak.length, 3)
+            self.assertEqual(habit.done_this_month, min(3, self.today.day))
+        self.assertEqual(self.checkouts, 1)
+        self.assertGreater(scope.statements, 5)
+
+    def test_update_hooks(self):
+        open_update_scope(None, None)
+        scope = base.current_scope()
+        crud.create_record(self.user_id, self.habit.id, self.today)
+        self.assertEqual(self.committed_records(), 0)
+        close_update_scope(None, None)
+        self.assertIsNone(base.current_scope())
+        self.assertEqual(self.committed_records(), 1)
+        self.assertGreater(scope.statements, 0)
+
+    def tearDown(self) -> None:
+        event.remove(base.engine, "checkout", self.count_checkout)
+        base.end_scope(commit=False)
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(StreakState).filter_by(habit=self.habit.id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
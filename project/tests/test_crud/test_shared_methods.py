@@ -0,0 +1,127 @@
+from sqlalchemy import event
+
+import base
+from base import Session, session_scope
+from controllers import cache, crud
+from models.models import Habit, Method, StreakState, User
+from unittest import TestCase
+import unittest
+
+
+class TestSharedMethods(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        crud.create_user(self.user_id, 0)
+        self.statements = []
+        event.listen(base.engine, "before_cursor_execute", self.count_statement)
+
+    def count_statement(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def method_count(self):
+        with Session() as s:
+            return s.query(Method).count()
+
+    def test_identical_methods_are_shared(self):
+        everyday = crud.create_method(type="interval", duration="day", interval=1)
+        self.statements.clear()
+        self.assertEqual(
+            crud.create_method(type="interval", duration="day", interval=1).id,
+            everyday.id,
+        )
+        self.assertEqual(self.statements, [])  # cached by definition
+
+        weekly = crud.create_method(type="count", duration="week", count=3)
+        days = crud.create_method(type="specified", duration="week", specified=[1, 3])
+        same_days = crud.create_method(
+            type="specified", duration="week", specified_mask=0b101
+        )
+        self.assertEqual(len({everyday.id, weekly.id, days.id}), 3)
+        self.assertEqual(same_days.id, days.id)
+        self.assertEqual(self.method_count(), 3)
+
+    def test_shared_after_cache_expires(self):
+        method = crud.create_method(type="interval", duration="day", interval=2)
+        cache.clear()
+        again = crud.create_method(type="interval", duration="day", interval=2)
+        self.assertEqual(again.id, method.id)
+        self.assertEqual(self.method_count(), 1)
+
+    def test_edit_and_delete_keep_shared_methods(self):
+        everyday = crud.create_method(type="interval", duration="day", interval=1)
+        habit1 = crud.create_habit("habit 1", self.user_id, everyday)
+        habit2 = crud.create_habit("habit 2", self.user_id, everyday)
+        weekly = crud.create_method(type="count", duration="week", count=3)
+
+        crud.edit_habit(habit1.id, new_method=weekly)
+        self.assertIsNotNone(crud.get_method(everyday.id))
+        crud.edit_habit(habit2.id, new_method=weekly)
+        self.assertIsNone(crud.get_method(everyday.id))
+
+        crud.delete_habit(crud.get_habit(habit1.id, self.user_id))
+        self.assertIsNotNone(crud.get_method(weekly.id))
+        crud.delete_habit(crud.get_habit(habit2.id, self.user_id))
+        self.assertIsNone(crud.get_method(weekly.id))
+        self.assertEqual(self.method_count(), 0)
+
+    def test_collect_unused_methods(self):
+        used = crud.create_method(type="interval", duration="day", interval=1)
+        crud.create_habit("habit", self.user_id, used)
+        for interval in range(2, 9):
+            crud.create_method(type="interval", duration="day", interval=interval)
+
+        self.assertEqual(crud.collect_unused_methods(batch_size=3), 7)
+        self.assertEqual(self.method_count(), 1)
+        self.assertEqual(crud.collect_unused_methods(), 0)
+
+        # the cache doesn't return collected methods.
+        unused = crud.create_method(type="interval", duration="day", interval=2)
+        with Session() as s:
+            self.assertIsNotNone(s.query(Method).filter_by(id=unused.id).one_or_none())
+
+    def test_habit_of_a_collected_method(self):
+        method = crud.create_method(type="interval", duration="day", interval=1)
+        crud.collect_unused_methods()
+        habit = crud.create_habit("habit", self.user_id, method)
+        self.assertEqual(crud.get_method(habit.method).interval, 1)
+
+    def test_habit_of_a_method_created_again(self):
+        method = crud.create_method(type="interval", duration="day", interval=1)
+        crud.collect_unused_methods()
+        # another method may take its id, and it may be created again under another.
+        other = crud.create_method(type="count", duration="week", count=2)
+        again = crud.create_method(type="interval", duration="day", interval=1)
+        habit = crud.create_habit("habit", self.user_id, method)
+        self.assertEqual(habit.method, again.id)
+        self.assertEqual(crud.get_method(other.id).count, 2)
+        self.assertEqual(self.method_count(), 2)
+
+    def test_created_in_a_scope_that_rolls_back(self):
+        with self.assertRaises(ValueError):
+            with session_scope():
+                method = crud.create_method(type="interval", duration="day", interval=4)
+                self.assertIsNotNone(crud.get_method(method.id))
+                raise ValueError
+        self.assertIsNone(crud.get_method(method.id))
+        self.assertEqual(self.method_count(), 0)
+
+        method = crud.create_method(type="interval", duration="day", interval=4)
+        habit = crud.create_habit("habit", self.user_id, method.id)
+        self.assertEqual(crud.get_method(habit.method).interval, 4)
+
+    def tearDown(self) -> None:
+        event.remove(base.engine, "before_cursor_execute", self.count_statement)
+        with Session() as s:
+            habit_ids = s.query(Habit.id).filter_by(user=self.user_id)
+            s.query(StreakState).filter(StreakState.habit.in_(habit_ids)).delete(
+                synchronize_session=False
+            )
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+import sqlalchemy as sqa
+
+from sqlalchemy.pool import StaticPool
+
+from dbpool import TimedQueuePool, engine_options, pool_status
+from unittest import TestCase
+import unittest
+
+
+class TestEngineOptions(TestCase):
+    def test_sqlite_uses_defaults(self):
+        self.assertEqual(engine_options("sqlite:////tmp/juno.db", {}), {})
+
+    def test_sqlite_memory_shares_a_connection(self):
+        for url in ["sqlite://", "sqlite:///:memory:"]:
+            options = engine_options(url, {})
+            self.assertIs(options["poolclass"], StaticPool)
+            self.assertFalse(options["connect_args"]["check_same_thread"])
+
+    def test_defaults(self):
+        options = engine_options("mysql+pymysql://juno@localhost/juno", {})
+        self.assertIs(options["poolclass"], TimedQueuePool)
+        self.assertEqual(options["pool_size"], 5)
+        self.assertEqual(options["max_overflow"], 10)
+        self.assertTrue(options["pool_pre_ping"])
+
+    def test_from_environment(self):
+        environ = {
+            "db_pool_size": "20",
+            "db_max_overflow": "0",
+            "db_pool_timeout": "2.5",
+            "db_pool_recycle": "280",
+            "db_pool_pre_ping": "False",
+        }
+        options = engine_options("postgresql://juno@localhost/juno", environ)
+        self.assertEqual(options["pool_size"], 20)
+        self.assertEqual(options["max_overflow"], 0)
+        self.assertEqual(options["pool_timeout"], 2.5)
+        self.assertEqual(options["pool_recycle"], 280)
+        self.assertFalse(options["pool_pre_ping"])
+
+
+class TestPoolStatus(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(self.directory.name, 'pool.db')}"
+        self.engine = sqa.create_engine(
+            url, poolclass=TimedQueuePool, pool_size=2, max_overflow=1, pool_timeout=0.1
+        )
+
+    def test_counts_checkouts(self):
+        connections = [self.engine.connect() for _ in range(3)]
+        status = pool_status(self.engine)
+        self.assertEqual(status["checked_out"], 3)
+        self.assertEqual(status["overflow"], 1)
+        self.assertEqual(status["checkouts"], 3)
+
+        with self.assertRaises(sqa.exc.TimeoutError):
+            self.engine.connect()
+        self.assertEqual(pool_status(self.engine)["timeouts"], 1)
+        self.assertGreaterEqual(pool_status(self.engine)["max_wait_ms"], 100)
+
+        for connection in connections:
+            connection.close()
+        status = pool_status(self.engine)
+        self.assertEqual(status["checked_out"], 0)
+        self.assertEqual(status["checked_in"], 2)
+
+    def test_other_pools(self):
+        engine = sqa.create_engine("sqlite://")
+        self.assertEqual(pool_status(engine), {"pool": "SingletonThreadPool"})
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.directory.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
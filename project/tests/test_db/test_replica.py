@@ -0,0 +1,110 @@
+import datetime
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+import base
+from base import ReadSession, Session, session_scope
+from controllers import cache, crud
+from models.models import Habit, Method, Record, StreakState, User
+from unittest import TestCase
+import unittest
+
+
+@unittest.skipUnless(base.engine.dialect.name == "sqlite", "replicates SQLite files")
+class TestReplica(TestCase):
+    """Two SQLite files, the test database as the primary and a copy of it as the
+    replica."""
+
+    def setUp(self) -> None:
+        self.user_id = 1
+        crud.create_user(self.user_id, 0)
+        method = crud.create_method(type="interval", duration="day", interval=1)
+        self.habit = crud.create_habit("replicated", self.user_id, method)
+        self.today = self.habit.today_in_timezone()
+        self.days = [self.today - datetime.timedelta(days=i) for i in range(5)]
+        crud.create_records(self.user_id, self.habit.id, self.days[:3])
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.replica_path = os.path.join(self.directory.name, "replica.db")
+        self.replicate()
+        base.configure_replica(f"sqlite:///{self.replica_path}")
+        base.recent_writers.clear()
+
+    def replicate(self):
+        """Copies the primary database to the replica, as replication would."""
+        with closing(sqlite3.connect(base.engine.url.database)) as primary:
+            with closing(sqlite3.connect(self.replica_path)) as replica:
+                primary.backup(replica)
+
+    def lag_window_passes(self):
+        base.recent_writers.clear()
+
+    def test_reads_your_writes(self):
+        self.assertEqual(self.habit.total_done_days, 3)
+        crud.create_record(self.user_id, self.habit.id, self.days[3])
+        self.assertEqual(self.habit.total_done_days, 4)
+
+        # the replica hasn't caught up yet.
+        self.lag_window_passes()
+        self.assertEqual(self.habit.total_done_days, 3)
+        self.replicate()
+        self.assertEqual(self.habit.total_done_days, 4)
+
+    def test_other_users_read_the_replica(self):
+        crud.create_record(self.user_id, self.habit.id, self.days[3])
+        with ReadSession(self.user_id) as s:
+            self.assertIs(s.bind, base.engine)
+        with ReadSession(self.user_id + 1) as s:
+            self.assertIs(s.bind, base.replica_engine)
+
+    def test_scope_reads_its_writes(self):
+        with session_scope():
+            crud.create_record(self.user_id, self.habit.id, self.days[3])
+            self.lag_window_passes()
+            self.assertEqual(self.habit.total_done_days, 4)
+            self.assertEqual(self.habit.done_this_week, self.records_this_week(4))
+
+    def records_this_week(self, count):
+        week_start = self.today - datetime.timedelta(days=self.today.isoweekday() - 1)
+        return sum(day >= week_start for day in self.days[:count])
+
+    def test_streak_state_is_calculated_from_the_primary(self):
+        self.assertEqual(self.habit.streak, 3)
+        crud.create_records(self.user_id, self.habit.id, self.days[3:])  # stale
+        self.lag_window_passes()
+        self.assertEqual(self.habit.total_done_days, 3)  # the replica lags
+        self.assertEqual(self.habit.streak, 5)
+        with Session() as s:
+            state = s.query(StreakState).filter_by(habit=self.habit.id).one()
+            self.assertEqual((state.streak, state.stale), (5, False))
+
+    def test_summaries(self):
+        crud.delete_record(crud.get_record(self.user_id, self.habit.id, self.days[0]))
+        self.lag_window_passes()
+        [summary] = crud.get_habit_summaries(self.user_id)
+        self.assertEqual(summary["total_done_days"], 3)
+        self.assertEqual(summary["streak"], 3)
+
+    def test_without_replica(self):
+        base.configure_replica(None)
+        with ReadSession(self.user_id) as s:
+            self.assertIs(s.bind, base.engine)
+
+    def tearDown(self) -> None:
+        base.configure_replica(None)
+        base.recent_writers.clear()
+        self.directory.cleanup()
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(StreakState).filter_by(habit=self.habit.id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
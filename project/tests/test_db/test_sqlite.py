@@ -0,0 +1,133 @@
+import datetime
+import os
+import tempfile
+import threading
+
+import sqlalchemy as sqa
+from sqlalchemy.orm import sessionmaker
+
+import base
+from base import Base, session_scope
+from controllers import cache, crud
+from dbpool import create_database_engine
+from models.models import Method, Record, User
+from persistence import SQLPersistence, persistence_table
+from unittest import TestCase
+import unittest
+
+
+class TestSQLiteFile(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.directory.name, 'juno.db')}"
+        self.engine = create_database_engine(self.url, {})
+
+    def pragma(self, name):
+        with self.engine.connect() as connection:
+            return connection.execute(sqa.text(f"PRAGMA {name}")).scalar()
+
+    def test_pragmas(self):
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("foreign_keys"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+
+    def test_models(self):
+        Base.metadata.create_all(self.engine)
+        Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        with Session() as s:
+            method = Method(type="specified", duration="month", specified=[1, 15])
+            s.add_all([User(1, 0), method])
+            s.commit()
+        with Session() as s:
+            method = s.query(Method).one()
+            self.assertEqual(method.type.code, "specified")
+            self.assertEqual(method.duration.code, "month")
+            self.assertEqual(method.specified_days, [1, 15])
+
+            # foreign keys are enforced.
+            s.add(Record(1, 1000, datetime.date(2022, 1, 1)))
+            with self.assertRaises(sqa.exc.IntegrityError):
+                s.commit()
+
+    def test_persistence(self):
+        persistence = SQLPersistence(url=self.url)
+        persistence.update_conversation("Logger", (1, 1), "log1")
+        persistence.update_user_data(1, {"habit": 2})
+        persistence.engine.dispose()
+
+        persistence = SQLPersistence(url=self.url)
+        self.assertEqual(persistence.get_conversations("Logger"), {(1, 1): "log1"})
+        self.assertEqual(persistence.get_user_data()[1], {"habit": 2})
+        persistence.engine.dispose()
+
+    def test_persistence_on_flush(self):
+        persistence = SQLPersistence(url=self.url, on_flush=True)
+        persistence.update_conversation("Logger", (1, 1), "log1")
+        self.assertEqual(
+            SQLPersistence(engine=self.engine).get_conversations("Logger"), {}
+        )
+        persistence.flush()
+        self.assertEqual(
+            SQLPersistence(engine=self.engine).get_conversations("Logger"),
+            {(1, 1): "log1"},
+        )
+        persistence.engine.dispose()
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.directory.cleanup()
+
+
+class TestSQLiteMemory(TestCase):
+    def test_threads_share_the_database(self):
+        engine = create_database_engine("sqlite://", {})
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as s:
+            s.add(User(1, 0))
+            s.commit()
+
+        users = []
+
+        def count_users():
+            with Session() as s:
+                users.append(s.query(User).count())
+
+        thread = threading.Thread(target=count_users)
+        thread.start()
+        thread.join()
+        self.assertEqual(users, [1])
+
+        persistence = SQLPersistence(engine=engine)
+        persistence.update_bot_data({"started": True})
+        self.assertEqual(
+            SQLPersistence(engine=engine).get_bot_data(), {"started": True}
+        )
+        engine.dispose()
+
+
+class TestSharedPersistence(TestCase):
+    """Persistence in the bot's own database, as with persistence_url = db_url."""
+
+    def test_written_after_the_scope_commits(self):
+        persistence = SQLPersistence(engine=base.engine, defer=base.after_commit)
+        with session_scope():
+            crud.create_user(1, 0)  # the scope holds the SQLite write lock
+            persistence.update_conversation("Logger", (1, 1), "log1")
+            self.assertEqual(
+                SQLPersistence(engine=base.engine).get_conversations("Logger"), {}
+            )
+        self.assertEqual(
+            SQLPersistence(engine=base.engine).get_conversations("Logger"),
+            {(1, 1): "log1"},
+        )
+
+    def tearDown(self) -> None:
+        with base.engine.begin() as connection:
+            connection.execute(sqa.delete(persistence_table))
+        crud.delete_user(1)
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
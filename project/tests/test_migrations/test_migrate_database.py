@@ -0,0 +1,179 @@
+import datetime
+
+import sqlalchemy as sqa
+
+from base import Base
+from models.models import Habit, Method, Record, StreakState, User
+from run import migrate_database
+from unittest import TestCase
+import unittest
+
+
+class TestMigrateDatabase(TestCase):
+    """Runs the migration on a separate in-memory database that has the tables but
+    not the indexes, like a database created before they were added."""
+
+    new_indexes = [
+        "uq_records_habit_date",
+        "ix_records_user_habit_date",
+        "ix_habits_user_normalized_name",
+        "uq_methods_definition",
+    ]
+
+    def setUp(self) -> None:
+        self.engine = sqa.create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        date = datetime.date(2022, 5, 1)
+        with self.engine.begin() as connection:
+            for name in self.new_indexes:
+                connection.execute(sqa.text(f"DROP INDEX {name}"))
+            connection.execute(
+                sqa.text("CREATE INDEX ix_habits_user_name ON habits (user, name)")
+            )
+            connection.execute(
+                sqa.text("ALTER TABLE habits DROP COLUMN normalized_name")
+            )
+            connection.execute(
+                sqa.text("ALTER TABLE methods DROP COLUMN specified_mask")
+            )
+            connection.execute(sqa.text("ALTER TABLE methods DROP COLUMN definition"))
+            connection.execute(
+                sqa.text("ALTER TABLE methods ADD COLUMN specified VARCHAR(300)")
+            )
+            connection.execute(
+                sqa.text(
+                    "INSERT INTO methods (id, type, duration, specified) "
+                    "VALUES (2, 'specified', 'month', '1,15,31'), "
+                    "(4, 'specified', 'week', '1,3'), "
+                    "(5, 'specified', 'week', '1,3')"
+                )
+            )
+            connection.execute(sqa.insert(User).values(id=1, timezone=0))
+            connection.execute(
+                sqa.insert(Method).values(id=1, type="interval", duration="day")
+            )
+            connection.execute(
+                sqa.insert(Habit).values(id=1, name=" My Habit", user=1, method=1)
+            )
+            # a copy of method 1, with a habit of its own.
+            connection.execute(
+                sqa.text(
+                    "INSERT INTO methods (id, type, duration) "
+                    "VALUES (3, 'interval', 'day')"
+                )
+            )
+            connection.execute(
+                sqa.insert(Habit).values(id=2, name="other", user=1, method=3)
+            )
+            connection.execute(
+                sqa.insert(Habit).values(id=3, name="weekly", user=1, method=5)
+            )
+            for day in [date, date, date, date + datetime.timedelta(days=1)]:
+                connection.execute(sqa.insert(Record).values(user=1, habit=1, date=day))
+            connection.execute(
+                sqa.insert(StreakState).values(habit=1, streak=4, stale=False)
+            )
+
+    def executed(self, *statements):
+        """Runs the migration, and returns how many times statements starting with
+        each of the given texts were executed."""
+        executed = [0] * len(statements)
+
+        def before_cursor_execute(conn, cursor, sql, *args):
+            for i, statement in enumerate(statements):
+                if sql.startswith(statement):
+                    executed[i] += 1
+
+        sqa.event.listen(self.engine, "before_cursor_execute", before_cursor_execute)
+        migrate_database(self.engine)
+        sqa.event.remove(self.engine, "before_cursor_execute", before_cursor_execute)
+        return executed
+
+    def index_names(self, table):
+        return {index["name"] for index in sqa.inspect(self.engine).get_indexes(table)}
+
+    def test_creates_indexes_and_deletes_duplicates(self):
+        migrate_database(self.engine)
+        indexes = set().union(
+            *[self.index_names(table) for table in ["records", "habits", "methods"]]
+        )
+        for name in self.new_indexes:
+            self.assertIn(name, indexes)
+        self.assertNotIn("ix_habits_user_name", indexes)
+
+        with self.engine.connect() as connection:
+            ids = connection.execute(
+                sqa.select(Record.id).order_by(Record.id)
+            ).scalars()
+            self.assertEqual(list(ids), [1, 4])
+            stale = connection.execute(sqa.select(StreakState.stale)).scalar()
+            self.assertTrue(stale)
+
+    def test_adds_and_fills_normalized_name(self):
+        migrate_database(self.engine)
+        with self.engine.connect() as connection:
+            name = connection.execute(sqa.select(Habit.normalized_name)).scalar()
+        self.assertEqual(name, "my habit")
+
+    def test_fills_normalized_names_in_one_statement(self):
+        self.assertEqual(self.executed("UPDATE habits SET normalized_name"), [1])
+
+    def test_converts_specified_days_to_mask(self):
+        migrate_database(self.engine)
+        with self.engine.connect() as connection:
+            masks = connection.execute(
+                sqa.select(Method.specified_mask).order_by(Method.id)
+            ).scalars()
+            self.assertEqual(list(masks), [None, 1 | 1 << 14 | 1 << 30, 1 | 1 << 2])
+
+    def test_converts_specified_days_in_one_statement(self):
+        self.assertEqual(self.executed("UPDATE methods SET specified_mask"), [1])
+
+    def test_merges_duplicate_methods(self):
+        migrate_database(self.engine)
+        with self.engine.connect() as connection:
+            methods = connection.execute(
+                sqa.select(Method.id, Method.definition).order_by(Method.id)
+            ).all()
+            self.assertEqual(
+                methods,
+                [
+                    (1, "interval:day:::"),
+                    (2, "specified:month:::1073758209"),
+                    (4, "specified:week:::5"),
+                ],
+            )
+            habit_methods = connection.execute(
+                sqa.select(Habit.method).order_by(Habit.id)
+            ).scalars()
+            self.assertEqual(list(habit_methods), [1, 1, 4])
+
+    def test_merges_duplicate_methods_in_one_statement_each(self):
+        executed = self.executed(
+            "UPDATE methods SET definition",
+            "UPDATE habits SET method",
+            "DELETE FROM methods",
+        )
+        self.assertEqual(executed, [1, 1, 1])
+
+    def test_can_run_twice(self):
+        migrate_database(self.engine)
+        migrate_database(self.engine)
+        self.assertIn("uq_records_habit_date", self.index_names("records"))
+
+    def test_unique_index_rejects_duplicates(self):
+        migrate_database(self.engine)
+        with self.assertRaises(sqa.exc.IntegrityError):
+            with self.engine.begin() as connection:
+                connection.execute(
+                    sqa.insert(Record).values(
+                        user=1, habit=1, date=datetime.date(2022, 5, 1)
+                    )
+                )
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Random habits, and the reference calculators reading their records from lists,
+shared by the randomized streak tests."""
+
+import datetime
+
+from models.calendarmath import days_to_mask
+from models.models import IntervalCalculator, CountCalculator, SpecifiedCalculator
+
+
+# The reference calculators, reading records from a list instead of the database.
+# Only their data access is replaced, everything they calculate is unchanged.
+class ListRecordsMixin:
+    def __init__(self, records, today_date, *args, **kwargs):
+        self.dates_list = kwargs.pop("dates")
+        super().__init__(records, today_date, *args, **kwargs)
+
+    def get_oldest_done_date(self):
+        return min(self.dates_list) if self.dates_list else None
+
+    def get_done_dates(self):
+        return list(self.dates_list)
+
+    def dones_in_duration(self):
+        return len(self.done_dates_in_duration())
+
+    def done_dates_in_duration(self):
+        return [
+            date
+            for date in self.dates_list
+            if self.duration_start <= date <= self.duration_end
+        ]
+
+
+class ReferenceIntervalCalculator(ListRecordsMixin, IntervalCalculator):
+    pass
+
+
+class ReferenceCountCalculator(ListRecordsMixin, CountCalculator):
+    pass
+
+
+class ReferenceSpecifiedCalculator(ListRecordsMixin, SpecifiedCalculator):
+    pass
+
+
+reference_calculators = {
+    "interval": ReferenceIntervalCalculator,
+    "count": ReferenceCountCalculator,
+    "specified": ReferenceSpecifiedCalculator,
+}
+
+
+class Case:
+    """One random habit: its method, done dates and today."""
+
+    def __init__(self, method, dates, today):
+        self.method = method
+        self.dates = sorted(set(dates))
+        self.today = today
+
+    def __repr__(self):
+        return f"Case(method={self.method}, today={self.today!r}, dates={self.dates!r})"
+
+    def run(self, calculator_class, operation):
+        calculator = calculator_class(
+            records=None,
+            today_date=self.today,
+            dates=list(self.dates),
+            interval=self.method.get("interval"),
+            duration=self.method["duration"],
+            count=self.method.get("count"),
+            specified_mask=days_to_mask(self.method.get("specified", [])),
+        )
+        return getattr(calculator, operation)()
+
+
+def random_method(rng):
+    type_ = rng.choice(["interval", "count", "specified"])
+    if type_ == "interval":
+        return {"type": type_, "duration": "day", "interval": rng.randint(1, 6)}
+    duration = rng.choice(["week", "month"])
+    if type_ == "count":
+        count = rng.randint(1, 7 if duration == "week" else 28)
+        return {"type": type_, "duration": duration, "count": count}
+    days = range(1, 8) if duration == "week" else range(1, 32)
+    specified = rng.sample(days, rng.randint(1, 4))
+    return {"type": type_, "duration": duration, "specified": specified}
+
+
+def is_goal_day(method, date, today):
+    if method["type"] == "interval":
+        return (today - date).days % method["interval"] == 0
+    if method["type"] == "count":
+        return True
+    if method["duration"] == "week":
+        return date.isoweekday() in method["specified"]
+    return date.day in method["specified"]
+
+
+def random_case(rng):
+    """Either random dates, or a habit that mostly sticks to its method, so that
+    long streaks and every edge of the oldest and current durations come up."""
+    method = random_method(rng)
+    today = datetime.date(2019, 1, 1) + datetime.timedelta(days=rng.randrange(2000))
+    span = rng.choice([1, 5, 12, 40, 100, 250])
+    days = [today - datetime.timedelta(days=i) for i in range(span)]
+
+    if rng.random() < 0.3:
+        density = rng.random()
+        dates = [day for day in days if rng.random() < density]
+    else:
+        miss = rng.choice([0, 0.02, 0.1])
+        dates = [
+            day
+            for day in days
+            if is_goal_day(method, day, today) and rng.random() >= miss
+        ]
+        if method["type"] == "count":
+            dates = [day for day in dates if rng.random() < 0.6]
+    return Case(method, dates, today)
@@ -0,0 +1,108 @@
+import datetime
+
+from base import Session
+from models.models import Habit, Record, Method, User, get_calculator_backends
+from models.models import calculator_backends
+from unittest import TestCase
+import unittest
+
+
+@unittest.skipUnless("bitmap" in get_calculator_backends(), "numpy is not installed")
+class TestBitmapBackend(TestCase):
+    """Bitmap calculators should give the same results as the database calculators."""
+
+    methods = [
+        {"type": "interval", "duration": "day", "interval": 1},
+        {"type": "interval", "duration": "day", "interval": 3},
+        {"type": "count", "duration": "week", "count": 4},
+        {"type": "count", "duration": "month", "count": 12},
+        {"type": "specified", "duration": "week", "specified": [1, 3, 5]},
+        {"type": "specified", "duration": "month", "specified": [1, 15, 31]},
+    ]
+
+    def setUp(self) -> None:
+        self.user_id = 1
+        self.first_day = datetime.date(2021, 1, 4)
+        self.method_ids = []
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            s.add(user)
+            s.commit()
+            for kwargs in self.methods:
+                method = Method(**kwargs)
+                s.add(method)
+                s.commit()
+                self.method_ids.append(method.id)
+                habit = Habit(f"{method.type}_habit", user.id, method.id)
+                s.add(habit)
+                s.commit()
+                # every day but a few gaps, and some days of a week left empty.
+                dates = [
+                    self.first_day + datetime.timedelta(days=i)
+                    for i in range(400)
+                    if i % 37 not in [5, 6] and i % 7 != 3
+                ]
+                s.add_all(Record(user.id, habit.id, date) for date in dates)
+                s.commit()
+
+    def get_calculator(self, habit, method, today, backend):
+        calculator_class = method.get_calculator(backend)
+        return calculator_class(
+            records=habit.records,
+            today_date=today,
+            interval=method.interval,
+            duration=method.duration,
+            count=method.count,
+            specified_mask=method.specified_mask,
+        )
+
+    def test_same_results_as_database_backend(self):
+        with Session() as s:
+            habits = s.query(Habit).filter_by(user=self.user_id).all()
+            for habit in habits:
+                method = s.query(Method).filter_by(id=habit.method).one()
+                for days in [0, 30, 120, 217, 399]:
+                    today = self.first_day + datetime.timedelta(days=days)
+                    for func in ["streak", "total_loggable_days"]:
+                        expected = getattr(
+                            self.get_calculator(habit, method, today, "database"), func
+                        )()
+                        result = getattr(
+                            self.get_calculator(habit, method, today, "bitmap"), func
+                        )()
+                        self.assertEqual(
+                            result, expected, f"{habit.name} {func} on {today}"
+                        )
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).filter(Method.id.in_(self.method_ids)).delete(
+                synchronize_session=False
+            )
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+
+
+class TestCalculatorBackends(TestCase):
+    def test_unknown_backend(self):
+        method = Method(type="interval", duration="day", interval=1)
+        with self.assertRaisesRegex(ValueError, "'abacus'"):
+            method.get_calculator("abacus")
+
+    def test_missing_dependency(self):
+        method = Method(type="interval", duration="day", interval=1)
+        get_calculator_backends()
+        bitmap = calculator_backends.pop("bitmap", None)
+        try:
+            with self.assertRaisesRegex(ValueError, "needs numpy"):
+                method.get_calculator("bitmap")
+        finally:
+            if bitmap:
+                calculator_backends["bitmap"] = bitmap
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import datetime
+import random
+
+from base import Session
+from models import calendarmath
+from models.models import Habit, Record, Method, User
+from unittest import TestCase
+import unittest
+
+
+class TestCountingDays(TestCase):
+    """Checks the arithmetic against counting every day of the range."""
+
+    def setUp(self) -> None:
+        self.random = random.Random(7)
+
+    def random_range(self):
+        start = datetime.date(1896, 1, 1) + datetime.timedelta(
+            days=self.random.randrange(50000)
+        )
+        end = start + datetime.timedelta(days=self.random.randrange(-3, 1500))
+        return start, end
+
+    def each_day(self, start, end):
+        return [
+            start + datetime.timedelta(days=i)
+            for i in range(calendarmath.days_in_range(start, end))
+        ]
+
+    def test_count_weekdays(self):
+        for _ in range(300):
+            start, end = self.random_range()
+            weekdays = self.random.sample(range(1, 8), self.random.randint(1, 7))
+            expected = sum(
+                day.isoweekday() in weekdays for day in self.each_day(start, end)
+            )
+            result = calendarmath.count_weekdays(start, end, weekdays)
+            self.assertEqual(result, expected, f"{start} to {end}, {weekdays}")
+
+    def test_count_month_days(self):
+        for _ in range(300):
+            start, end = self.random_range()
+            month_days = self.random.sample(range(1, 32), self.random.randint(1, 5))
+            month_days.append(self.random.choice([29, 30, 31]))
+            expected = sum(day.day in month_days for day in self.each_day(start, end))
+            result = calendarmath.count_month_days(start, end, month_days)
+            self.assertEqual(result, expected, f"{start} to {end}, {month_days}")
+
+    def test_durations_in_range(self):
+        for _ in range(300):
+            start, end = self.random_range()
+            days = self.each_day(start, end)
+            for duration in [calendarmath.week, calendarmath.month]:
+                expected = len(
+                    {calendarmath.first_day_of_duration(day, duration) for day in days}
+                )
+                result = calendarmath.durations_in_range(start, end, duration)
+                self.assertEqual(result, expected, f"{start} to {end}, {duration}")
+
+    def test_day_masks(self):
+        for _ in range(300):
+            days = self.random.sample(range(1, 32), self.random.randint(0, 31))
+            mask = calendarmath.days_to_mask(days)
+            self.assertLess(mask, 1 << 31)
+            self.assertEqual(calendarmath.mask_to_days(mask), sorted(days))
+
+    def test_dates_to_mask(self):
+        monday = datetime.date(2022, 5, 9)
+        dates = [monday, monday + datetime.timedelta(days=6)]
+        self.assertEqual(
+            calendarmath.dates_to_mask(dates, calendarmath.week), 0b1000001
+        )
+        self.assertEqual(
+            calendarmath.dates_to_mask(dates, calendarmath.month), 1 << 8 | 1 << 14
+        )
+
+
+class TestLoggableDays(TestCase):
+    """Checks the arithmetic against the calculators' week by week / month by month walk."""
+
+    methods = [
+        {"type": "interval", "duration": "day", "interval": 3},
+        {"type": "count", "duration": "week", "count": 3},
+        {"type": "count", "duration": "month", "count": 20},
+        {"type": "specified", "duration": "week", "specified": [2, 6, 7]},
+        {"type": "specified", "duration": "month", "specified": [1, 15, 29, 31]},
+    ]
+
+    def setUp(self) -> None:
+        self.user_id = 1
+        self.oldest = datetime.date(2019, 12, 18)
+        self.method_ids = []
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            s.add(user)
+            s.commit()
+            for kwargs in self.methods:
+                method = Method(**kwargs)
+                s.add(method)
+                s.commit()
+                self.method_ids.append(method.id)
+                habit = Habit(f"{method.type}_habit", user.id, method.id)
+                s.add(habit)
+                s.commit()
+                s.add(Record(user.id, habit.id, self.oldest))
+                s.commit()
+
+    def test_same_as_calculators(self):
+        with Session() as s:
+            habits = s.query(Habit).filter_by(user=self.user_id).all()
+            for habit in habits:
+                method = s.query(Method).filter_by(id=habit.method).one()
+                for days in range(0, 800, 11):
+                    today = self.oldest + datetime.timedelta(days=days)
+                    calculator = method.get_calculator("database")(
+                        records=habit.records,
+                        today_date=today,
+                        interval=method.interval,
+                        duration=method.duration,
+                        count=method.count,
+                        specified_mask=method.specified_mask,
+                    )
+                    if method.type == "interval":
+                        result = calendarmath.interval_loggable_days(
+                            self.oldest, today, method.interval
+                        )
+                    elif method.type == "count":
+                        result = calendarmath.count_loggable_days(
+                            self.oldest, today, method.count, method.duration
+                        )
+                    else:
+                        result = calendarmath.specified_loggable_days(
+                            self.oldest, today, method.specified_days, method.duration
+                        )
+                    self.assertEqual(
+                        result,
+                        calculator.total_loggable_days(),
+                        f"{habit.name} on {today}",
+                    )
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).filter(Method.id.in_(self.method_ids)).delete(
+                synchronize_session=False
+            )
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import datetime
+
+from base import Session
+from models.models import (
+    CountCalculator,
+    Habit,
+    InMemoryCountCalculator,
+    Record,
+    Method,
+    User,
+)
+from unittest import TestCase
+import unittest
+
+
+class TestInMemoryCountStreak(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        self.first_day = datetime.date(2020, 1, 1)
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            self.method = Method(type="count", duration="week", count=3)
+            s.add_all([user, self.method])
+            s.commit()
+            self.habit = Habit("count_habit_week_3days", user.id, self.method.id)
+            s.add(self.habit)
+            s.commit()
+            # every other day for two years, with a two week gap in the middle.
+            self.dates = [
+                self.first_day + datetime.timedelta(days=i)
+                for i in range(0, 730, 2)
+                if not 300 <= i < 314
+            ]
+            s.add_all(Record(user.id, self.habit.id, date) for date in self.dates)
+            s.commit()
+
+    def get_calculator(self, calculator_class, today):
+        with Session() as s:
+            habit = s.query(Habit).filter_by(user=self.user_id).one()
+            return calculator_class(
+                records=habit.records,
+                today_date=today,
+                count=self.method.count,
+                duration=self.method.duration,
+            )
+
+    def test_same_streak_as_database_calculator(self):
+        for days in [0, 3, 200, 305, 320, 729]:
+            today = self.first_day + datetime.timedelta(days=days)
+            expected = self.get_calculator(CountCalculator, today).streak()
+            result = self.get_calculator(InMemoryCountCalculator, today).streak()
+            self.assertEqual(result, expected, f"today is {today}")
+
+    def test_dates_without_records(self):
+        today = self.first_day + datetime.timedelta(days=729)
+        expected = self.get_calculator(CountCalculator, today).streak()
+        calculator = InMemoryCountCalculator(
+            records=None,
+            today_date=today,
+            count=self.method.count,
+            duration=self.method.duration,
+            dates=self.dates,
+        )
+        self.assertEqual(calculator.streak(), expected)
+
+    def test_no_dates(self):
+        calculator = InMemoryCountCalculator(
+            records=None,
+            today_date=self.first_day,
+            count=self.method.count,
+            duration=self.method.duration,
+            dates=[],
+        )
+        self.assertEqual(calculator.streak(), 0)
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).filter_by(id=self.method.id).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Randomized differential tests: fast calculators vs. the reference calculators.
+
+Random record histories, methods and "today" dates are fed to the reference
+IntervalCalculator, CountCalculator and SpecifiedCalculator and to every faster
+calculator, and their streak() and total_loggable_days() must match. Records are
+kept in lists instead of the database, so thousands of cases run per second.
+
+A failing case is shrunk to a minimal reproduction before it is reported.
+"""
+
+import datetime
+import random
+
+from models.models import get_calculator_backends
+from tests.test_streak.helpers import Case, random_case, reference_calculators
+from tests.test_streak.helpers import ReferenceCountCalculator
+from unittest import TestCase
+import unittest
+
+
+class TestDifferential(TestCase):
+    cases = 3000
+    seed = 20220101
+    operations = ["streak", "total_loggable_days"]
+
+    def engines(self):
+        """The calculators to check: every backend except the reference one."""
+        return {
+            backend: calculators
+            for backend, calculators in get_calculator_backends().items()
+            if backend != "database"
+        }
+
+    def mismatch(self, case, calculator_class, operation):
+        """Returns (expected, result) if calculator_class doesn't match the reference."""
+        if operation == "total_loggable_days" and not case.dates:
+            return None  # needs at least one record
+        expected = case.run(reference_calculators[case.method["type"]], operation)
+        result = case.run(calculator_class, operation)
+        if result != expected:
+            return expected, result
+        return None
+
+    def shrink(self, case, calculator_class, operation):
+        """Removes dates and moves today back, for as long as the case still fails."""
+        shrunk = True
+        while shrunk:
+            shrunk = False
+            for i in range(len(case.dates)):
+                smaller = Case(
+                    case.method, case.dates[:i] + case.dates[i + 1 :], case.today
+                )
+                if self.mismatch(smaller, calculator_class, operation):
+                    case, shrunk = smaller, True
+                    break
+            if not shrunk and case.dates and case.today > case.dates[-1]:
+                earlier = Case(
+                    case.method, case.dates, case.today - datetime.timedelta(days=1)
+                )
+                if self.mismatch(earlier, calculator_class, operation):
+                    case, shrunk = earlier, True
+        return case
+
+    def test_engines_match_reference(self):
+        rng = random.Random(self.seed)
+        for _ in range(self.cases):
+            case = random_case(rng)
+            for backend, calculators in self.engines().items():
+                calculator_class = calculators[case.method["type"]]
+                for operation in self.operations:
+                    if not self.mismatch(case, calculator_class, operation):
+                        continue
+                    case = self.shrink(case, calculator_class, operation)
+                    expected, result = self.mismatch(case, calculator_class, operation)
+                    self.fail(
+                        f"{calculator_class.__name__} ({backend}).{operation}() "
+                        f"returned {result}, reference returned {expected}.\n"
+                        f"Minimal case: {case}"
+                    )
+
+    def test_shrink(self):
+        """A calculator that is wrong whenever there are 2+ dates is shrunk to 2 dates."""
+
+        class WrongCalculator(ReferenceCountCalculator):
+            def streak(self):
+                return super().streak() + (len(self.dates_list) >= 2)
+
+        method = {"type": "count", "duration": "week", "count": 1}
+        today = datetime.date(2022, 3, 10)
+        dates = [today - datetime.timedelta(days=i) for i in range(0, 30, 3)]
+        case = self.shrink(Case(method, dates, today), WrongCalculator, "streak")
+        self.assertEqual(len(case.dates), 2)
+        self.assertEqual(case.today, case.dates[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import datetime
+
+from base import Session
+from models.models import Habit, InMemoryIntervalCalculator, Record, Method, User
+from unittest import TestCase
+import unittest
+
+
+class TestLongIntervalStreak(TestCase):
+    """Regression test for streaks longer than python's recursion limit."""
+
+    def setUp(self) -> None:
+        self.user_id = 1
+        self.today = datetime.date(2021, 12, 30)
+        self.days = 5 * 365 + 1
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            self.method = Method(type="interval", duration="day", interval=1)
+            s.add_all([user, self.method])
+            s.commit()
+            self.habit = Habit("everyday_habit", user.id, self.method.id)
+            s.add(self.habit)
+            s.commit()
+            self.records = [
+                Record(user.id, self.habit.id, self.today - datetime.timedelta(days=i))
+                for i in range(self.days)
+            ]
+            s.add_all(self.records)
+            s.commit()
+
+    def get_calculator(self, interval=1):
+        with Session() as s:
+            habit = s.query(Habit).filter_by(user=self.user_id).one()
+            return InMemoryIntervalCalculator(
+                records=habit.records,
+                today_date=self.today,
+                interval=interval,
+                duration=self.method.duration,
+            )
+
+    def delete_record(self, date):
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id, date=date).delete()
+            s.commit()
+
+    def test_five_years_everyday(self):
+        calculator = self.get_calculator()
+        self.assertEqual(calculator.streak(), self.days)
+
+    def test_five_years_today_not_logged(self):
+        self.delete_record(self.today)
+        calculator = self.get_calculator()
+        self.assertEqual(calculator.streak(), self.days - 1)
+
+    def test_five_years_broken_in_the_middle(self):
+        self.delete_record(self.today - datetime.timedelta(days=1000))
+        calculator = self.get_calculator()
+        self.assertEqual(calculator.streak(), 1000)
+
+    def test_five_years_every_third_day(self):
+        calculator = self.get_calculator(interval=3)
+        self.assertEqual(calculator.streak(), len(range(0, self.days, 3)))
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).filter_by(id=self.method.id).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import datetime
+
+from sqlalchemy import event
+from base import Session, engine
+from models.models import Habit, Record, RecordDates, Method, User
+from unittest import TestCase
+import unittest
+
+
+class TestRecordDates(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            self.method = Method(type="interval", duration="day", interval=1)
+            s.add_all([user, self.method])
+            s.commit()
+            self.habit = Habit("record_dates_habit", user.id, self.method.id)
+            s.add(self.habit)
+            s.commit()
+            self.dates = [
+                datetime.date(2021, 12, 1) + datetime.timedelta(days=i * 3)
+                for i in range(20)
+            ]
+            s.add_all(Record(user.id, self.habit.id, date) for date in self.dates)
+            s.commit()
+
+        self.statements = 0
+        event.listen(engine, "before_cursor_execute", self.count_statement)
+
+    def count_statement(self, *args):
+        self.statements += 1
+
+    def test_from_aggregate(self):
+        record_dates = RecordDates.from_aggregate(self.habit.records)
+        self.assertEqual(self.statements, 1)
+        self.assertEqual(record_dates.count, 20)
+        self.assertEqual(record_dates.oldest, self.dates[0])
+        self.assertEqual(record_dates.newest, self.dates[-1])
+        self.assertIsNone(record_dates.dates)
+
+    def test_load(self):
+        record_dates = RecordDates.load(self.habit.records)
+        self.assertEqual(self.statements, 1)
+        self.assertEqual(record_dates.dates, self.dates)
+        self.assertEqual(record_dates.count, 20)
+        self.assertEqual(record_dates.oldest, self.dates[0])
+        self.assertEqual(record_dates.newest, self.dates[-1])
+
+    def test_no_records(self):
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.commit()
+        self.assertEqual(RecordDates.from_aggregate(self.habit.records).count, 0)
+        self.assertIsNone(RecordDates.load(self.habit.records).oldest)
+
+    def tearDown(self) -> None:
+        event.remove(engine, "before_cursor_execute", self.count_statement)
+
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).filter_by(id=self.method.id).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+
+
+if __name__ == "__main__":
+    unittest.main()
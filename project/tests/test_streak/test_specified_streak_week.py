@@ -20,7 +20,7 @@ class TestSpecifiedStreakBase(TestCase):
             calculator = method.calculator(
                 records=habit.records,
                 today_date=self.today,
-                specified=method.specified_days,
+                specified_mask=method.specified_mask,
                 duration=method.duration,
             )
             return calculator
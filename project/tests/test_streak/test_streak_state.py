@@ -0,0 +1,139 @@
+import datetime
+
+from base import Session
+from controllers import cache, crud
+from models.models import Habit, Record, Method, StreakState, User
+from unittest import TestCase
+import unittest
+
+
+class TestStreakStateBase(TestCase):
+    method_kwargs = {}
+
+    def setUp(self) -> None:
+        self.user_id = 1
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            self.method = Method(**self.method_kwargs)
+            s.add_all([user, self.method])
+            s.commit()
+            self.habit = Habit("streak_state_habit", user.id, self.method.id)
+            s.add(self.habit)
+            s.commit()
+        self.today = self.habit.today_in_timezone()
+
+    def log(self, *days_ago):
+        for days in days_ago:
+            date = self.today - datetime.timedelta(days=days)
+            crud.create_record(self.user_id, self.habit.id, date)
+
+    def unlog(self, days_ago):
+        date = self.today - datetime.timedelta(days=days_ago)
+        crud.delete_record(crud.get_record(self.user_id, self.habit.id, date))
+
+    def get_state(self):
+        with Session() as s:
+            return s.query(StreakState).filter_by(habit=self.habit.id).one_or_none()
+
+    def calculated_streak(self):
+        return self.habit.get_method_calculator().streak()
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(StreakState).filter_by(habit=self.habit.id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        cache.clear()
+
+
+class TestEverydayStreakState(TestStreakStateBase):
+    method_kwargs = {"type": "interval", "duration": "day", "interval": 1}
+
+    def test_state_created_on_first_read(self):
+        self.log(1, 2, 3)
+        self.assertIsNone(self.get_state())
+        self.assertEqual(self.habit.streak, 3)
+        state = self.get_state()
+        self.assertEqual(state.streak, 3)
+        self.assertEqual(state.evaluated_on, self.today)
+        self.assertFalse(state.stale)
+
+    def test_logging_today_updates_state(self):
+        self.log(1, 2)
+        self.assertEqual(self.habit.streak, 2)
+        self.log(0)
+        state = self.get_state()
+        self.assertFalse(state.stale)
+        self.assertEqual(state.streak, 3)
+        self.assertEqual(state.streak, self.calculated_streak())
+
+    def test_unlogging_today_updates_state(self):
+        self.log(0, 1, 2)
+        self.assertEqual(self.habit.streak, 3)
+        self.unlog(0)
+        state = self.get_state()
+        self.assertFalse(state.stale)
+        self.assertEqual(state.streak, 2)
+        self.assertEqual(state.streak, self.calculated_streak())
+
+    def test_logging_an_older_day_makes_state_stale(self):
+        self.log(1, 3)
+        self.assertEqual(self.habit.streak, 1)
+        self.log(2)
+        self.assertTrue(self.get_state().stale)
+        self.assertEqual(self.habit.streak, 3)
+        self.assertFalse(self.get_state().stale)
+
+    def test_state_from_another_day_is_recalculated(self):
+        self.log(0, 1)
+        self.assertEqual(self.habit.streak, 2)
+        with Session() as s:
+            s.query(StreakState).filter_by(habit=self.habit.id).update(
+                {"evaluated_on": self.today - datetime.timedelta(days=1), "streak": 7}
+            )
+            s.commit()
+        self.assertEqual(self.habit.streak, 2)
+
+    def test_method_change_makes_state_stale(self):
+        self.log(0, 2, 4)
+        self.assertEqual(self.habit.streak, 1)
+        new_method = crud.create_method(type="interval", duration="day", interval=2)
+        crud.edit_habit(self.habit.id, new_method=new_method)
+        self.assertTrue(self.get_state().stale)
+        self.habit = crud.get_habit(self.habit.id, self.user_id)
+        self.assertEqual(self.habit.streak, 3)
+
+
+class TestCountStreakState(TestStreakStateBase):
+    method_kwargs = {"type": "count", "duration": "week", "count": 2}
+
+    def test_reaching_count_in_current_week(self):
+        self.assertEqual(self.habit.streak, 0)
+        self.log(0)
+        self.assertEqual(self.get_state().duration_dones, 1)
+        self.assertEqual(self.get_state().streak, 0)
+        self.log(7)
+        self.assertTrue(self.get_state().stale)
+        self.assertEqual(self.habit.streak, self.calculated_streak())
+
+    def test_current_week_changes_are_incremental(self):
+        self.log(7, 8, 9, 10, 11, 12, 13)
+        streak = self.habit.streak
+        self.log(0)
+        if self.today.isoweekday() > 1:
+            self.log(1)
+            self.unlog(1)
+            self.log(1)
+        state = self.get_state()
+        self.assertFalse(state.stale)
+        self.assertEqual(state.streak, self.calculated_streak())
+        self.assertEqual(state.duration_dones, min(self.today.isoweekday(), 2))
+        self.assertGreaterEqual(state.streak, streak)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import datetime
+import random
+
+from sqlalchemy import event
+
+import base
+from base import Session
+from controllers import cache, crud
+from models import timeline
+from models.calendarmath import days_to_mask
+from models.models import Habit, Record, Method, StreakState, User
+from tests.test_streak.helpers import Case, random_case, reference_calculators
+from unittest import TestCase
+import unittest
+
+
+class TestTimelineMatchesReference(TestCase):
+    """Every point of the timeline is the reference streak on its last day."""
+
+    cases = 300
+    seed = 10
+
+    def test_points_match_reference_streak(self):
+        rng = random.Random(self.seed)
+        for _ in range(self.cases):
+            case = random_case(rng)
+            method = case.method
+            points, longest = timeline.streak_timeline(
+                case.dates,
+                case.today,
+                method["type"],
+                method["duration"],
+                interval=method.get("interval"),
+                count=method.get("count"),
+                specified_mask=days_to_mask(method.get("specified", [])),
+            )
+            if not case.dates:
+                self.assertEqual(points, [])
+                continue
+            calculator_class = reference_calculators[method["type"]]
+            for point in points:
+                expected = Case(method, case.dates, point.end).run(
+                    calculator_class, "streak"
+                )
+                self.assertEqual(point.streak, expected, f"{point} of {case}")
+            self.assertEqual(longest.length, max(point.streak for point in points))
+            self.assertEqual(points[-1].end, case.today)
+
+    def test_longest_streak_dates(self):
+        today = datetime.date(2022, 5, 20)
+        days_ago = [30, 29, 28, 27, 20, 19, 1, 0]
+        dates = sorted(today - datetime.timedelta(days=days) for days in days_ago)
+        points, longest = timeline.streak_timeline(dates, today, "interval", "day", 1)
+        self.assertEqual(len(points), 31)
+        self.assertEqual(
+            longest,
+            (
+                4,
+                today - datetime.timedelta(days=30),
+                today - datetime.timedelta(days=27),
+            ),
+        )
+
+    def test_longest_streak_weeks(self):
+        # weeks starting 2 may, 9 may and 23 may are done, 16 may isn't.
+        today = datetime.date(2022, 5, 25)
+        dates = [datetime.date(2022, 5, day) for day in [3, 5, 10, 11, 17, 23, 24]]
+        points, longest = timeline.streak_timeline(
+            dates, today, "count", "week", count=2
+        )
+        self.assertEqual([point.streak for point in points], [1, 2, 2, 1])
+        self.assertEqual(
+            longest, (2, datetime.date(2022, 5, 3), datetime.date(2022, 5, 15))
+        )
+
+
+class TestTimelineCache(TestCase):
+    def setUp(self) -> None:
+        self.user_id = 1
+        with Session(expire_on_commit=False) as s:
+            user = User(self.user_id, 0)
+            method = Method(type="interval", duration="day", interval=1)
+            s.add_all([user, method])
+            s.commit()
+            self.habit = Habit("timeline_habit", user.id, method.id)
+            s.add(self.habit)
+            s.commit()
+        self.today = self.habit.today_in_timezone()
+
+    def log(self, *days_ago):
+        for days in days_ago:
+            date = self.today - datetime.timedelta(days=days)
+            crud.create_record(self.user_id, self.habit.id, date)
+
+    def test_cached_until_records_change(self):
+        self.log(5, 4, 3, 1)
+        self.assertEqual(self.habit.longest_streak.length, 3)
+        self.assertIs(self.habit.streak_timeline(), self.habit.streak_timeline())
+
+        self.log(2)
+        self.assertEqual(self.habit.longest_streak.length, 5)
+        record = crud.get_record(
+            self.user_id, self.habit.id, self.today - datetime.timedelta(days=4)
+        )
+        crud.delete_record(record)
+        self.assertEqual(self.habit.longest_streak.length, 3)
+
+    def test_invalidated_while_loading(self):
+        self.log(3, 2, 1)
+
+        def invalidate_while_loading(conn, cursor, statement, *args):
+            # a write committed by another handler, after the records were read.
+            if statement.startswith("SELECT records"):
+                timeline.invalidate(self.habit.id)
+
+        event.listen(base.engine, "after_cursor_execute", invalidate_while_loading)
+        try:
+            self.assertEqual(self.habit.longest_streak.length, 3)
+        finally:
+            event.remove(base.engine, "after_cursor_execute", invalidate_while_loading)
+        self.assertIsNone(timeline.get_cached(self.habit.id, self.today)[0])
+
+    def test_method_change_clears_cache(self):
+        self.log(4, 2, 0)
+        self.assertEqual(self.habit.longest_streak.length, 1)
+        new_method = crud.create_method(type="interval", duration="day", interval=2)
+        crud.edit_habit(self.habit.id, new_method=new_method)
+        self.habit = crud.get_habit(self.habit.id, self.user_id)
+        self.assertEqual(self.habit.longest_streak.length, 3)
+
+    def tearDown(self) -> None:
+
+        with Session() as s:
+            s.query(Record).filter_by(user=self.user_id).delete()
+            s.query(StreakState).filter_by(habit=self.habit.id).delete()
+            s.query(Habit).filter_by(user=self.user_id).delete()
+            s.query(Method).delete()
+            s.query(User).filter_by(id=self.user_id).delete()
+            s.commit()
+        timeline.invalidate(self.habit.id)
+        cache.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()